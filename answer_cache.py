@@ -0,0 +1,165 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from data_cache import cached_history
+from fundamentals import cached_fundamentals
+
+ANSWER_CACHE_MAX_ENTRIES = 1024
+# Answers are dropped after this long even if their data has not changed.
+ANSWER_CACHE_MAX_AGE_SECONDS = 24 * 3600
+# News has no as-of timestamp of its own; answers about it last this long.
+NEWS_AS_OF_SECONDS = 15 * 60
+
+_FUNDAMENTALS_TOOLS = {
+    'get_dividend_info', 'get_pe_ratio', 'get_52_week_high_low', 'get_market_cap', 'get_next_earnings_date',
+}
+_CONTRACTIONS = [
+    (re.compile(r"\bwhat's\b"), 'what is'),
+    (re.compile(r"\bhow's\b"), 'how is'),
+    (re.compile(r"\bwhats\b"), 'what is'),
+]
+_FILLER = re.compile(r'\b(please|pls|can you|could you|tell me|show me|give me|current|currently|the|a|an)\b')
+_PUNCTUATION = re.compile(r"[^\w/.$-]+")
+
+
+def normalize_question(question):
+    """Lower-cased question without filler words and punctuation, for cache keys."""
+    text = question.lower()
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = _FILLER.sub(' ', text)
+    text = _PUNCTUATION.sub(' ', text)
+    return ' '.join(text.strip(' .').split())
+
+
+def _history_as_of(ticker):
+    # The last bar's date alone doesn't change during the session, its Close does.
+    data = cached_history(ticker, '1y')
+    if data is None or data.empty:
+        return None
+    return f'{data.index[-1].isoformat()}@{float(data.Close.iloc[-1])!r}'
+
+
+def _fundamentals_as_of(ticker):
+    snapshot = cached_fundamentals(ticker)
+    return snapshot.fetched_at if snapshot is not None else None
+
+
+def _tickers(value):
+    # Same forms tool_executor accepts: a list or a comma-separated string.
+    if isinstance(value, str):
+        value = value.split(',')
+    return [str(t).strip() for t in value or [] if str(t).strip()]
+
+
+def data_as_of(function_name, args):
+    """Version of the data a tool call reads: last bar and its close, fundamentals fetch time or news window.
+
+    Only data already in the history or fundamentals cache is consulted, so
+    this never waits on the provider. Returns None when the version cannot be
+    determined that way, in which case the answer is not looked up or cached.
+    """
+    if function_name == 'compare_stock_prices':
+        versions = [_history_as_of(t) for t in _tickers(args.get('tickers'))]
+        return tuple(versions) if versions and None not in versions else None
+    ticker = args.get('ticker')
+    if not ticker:
+        return None
+    if function_name in _FUNDAMENTALS_TOOLS:
+        return _fundamentals_as_of(ticker)
+    if function_name == 'get_stock_news':
+        return int(time.time() // NEWS_AS_OF_SECONDS)
+    return _history_as_of(ticker)
+
+
+class AnswerCache:
+    """LRU cache of whole chat answers keyed by question, tool calls and data as-of.
+
+    A key only matches while the price history or fundamentals snapshot the
+    tools read is unchanged, so new bars or a refreshed snapshot make old
+    answers unreachable; they age out through the LRU bound. The cache also
+    remembers which tool calls the model chose for a question, so a repeat of
+    it can be looked up without asking the model again.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES, max_age=ANSWER_CACHE_MAX_AGE_SECONDS):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._answers = OrderedDict()
+        self._resolutions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _bound(self, entries):
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def resolution(self, normalized):
+        """Return the [(function name, args)] last used to answer `normalized`, or None."""
+        with self._lock:
+            calls = self._resolutions.get(normalized)
+            if calls is not None:
+                self._resolutions.move_to_end(normalized)
+            return calls
+
+    def remember_resolution(self, normalized, calls):
+        with self._lock:
+            self._resolutions[normalized] = calls
+            self._resolutions.move_to_end(normalized)
+            self._bound(self._resolutions)
+
+    def key(self, normalized, calls):
+        """Cache key for answering `normalized` with `calls` on today's data, or None if uncacheable."""
+        try:
+            versions = tuple(data_as_of(name, args) for name, args in calls)
+        except Exception:
+            return None
+        if None in versions:
+            return None
+        calls_key = tuple((name, json.dumps(args, sort_keys=True)) for name, args in calls)
+        return normalized, calls_key, versions
+
+    def get(self, key):
+        with self._lock:
+            entry = self._answers.get(key)
+            if entry is not None and time.time() - entry[0] > self.max_age:
+                del self._answers[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._answers.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, answer):
+        with self._lock:
+            self._answers[key] = (time.time(), answer)
+            self._answers.move_to_end(key)
+            self._bound(self._answers)
+
+    def clear(self):
+        with self._lock:
+            self._answers.clear()
+            self._resolutions.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._answers),
+                'resolutions': len(self._resolutions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+            }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,25 @@
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """Open a temporary file for writing and move it over `path` once the block finishes.
+
+    Readers see either the old file or the new one, never a partial write.
+    The temporary name carries the process and thread id, so concurrent
+    writers of the same path each write their own file; if the block raises,
+    the temporary file is removed and `path` is left as it was.
+    """
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,431 @@
+"""Offline benchmarks for the chatbot tools and the forecasting pipeline.
+
+Runs against recorded responses through the replay provider, so no network
+is needed. Record real fixtures by running the app with STOCKBOT_RECORD_DIR
+set, or generate synthetic ones:
+
+    python bench.py make-fixtures --out fixtures
+    python bench.py run --fixtures fixtures --out bench.json
+    python bench.py run --fixtures fixtures --baseline bench.json
+    python bench.py check --fixtures fixtures
+
+Each result reports wall time over several repeats, the process peak RSS and
+the Python allocations (tracemalloc) of one extra instrumented run. With
+--baseline, benchmarks whose median time regressed by more than --threshold
+are listed and the command exits non-zero. `check` verifies that cached and
+persisted state reproduces what it was built from, and exits non-zero if not.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_TICKERS = ['AAPL', 'MSFT']
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'function_config.json')
+
+# Arguments each tool in function_config.json is benchmarked with.
+TOOL_ARGS = {
+    'get_stock_price': {'ticker': 'AAPL'},
+    'calculate_SMA': {'ticker': 'AAPL', 'window': 50},
+    'calculate_EMA': {'ticker': 'AAPL', 'window': 20},
+    'calculate_RSI': {'ticker': 'AAPL'},
+    'calculate_MACD': {'ticker': 'AAPL'},
+    'plot_stock_price': {'ticker': 'AAPL'},
+    'compare_stock_prices': {'tickers': ['AAPL', 'MSFT'], 'period': '5y'},
+    'average_volume': {'ticker': 'AAPL', 'period': '3mo'},
+    'get_dividend_info': {'ticker': 'AAPL'},
+    'get_stock_news': {'ticker': 'AAPL'},
+    'calculate_daily_returns': {'ticker': 'AAPL'},
+    'get_pe_ratio': {'ticker': 'AAPL'},
+    'get_52_week_high_low': {'ticker': 'AAPL'},
+    'get_market_cap': {'ticker': 'AAPL'},
+    'get_next_earnings_date': {'ticker': 'AAPL'},
+}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# FIXTURES
+# ─────────────────────────────────────────────────────────────────────────────
+def make_fixtures(out, tickers, years, seed=0):
+    """Write synthetic replay fixtures (random-walk prices) for `tickers`."""
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp.today().normalize()
+    index = pd.bdate_range(end=end, periods=years * 252, tz='America/New_York', name='Date')
+    for ticker in tickers:
+        directory = os.path.join(out, ticker)
+        os.makedirs(directory, exist_ok=True)
+        close = 50 * np.exp(np.cumsum(rng.normal(0.0003, 0.018, len(index))))
+        spread = np.abs(rng.normal(0, 0.01, len(index)))
+        history = pd.DataFrame({
+            'Open': close * (1 + rng.normal(0, 0.005, len(index))),
+            'High': close * (1 + spread),
+            'Low': close * (1 - spread),
+            'Close': close,
+            'Volume': rng.integers(5_000_000, 50_000_000, len(index)),
+            'Dividends': 0.0,
+            'Stock Splits': 0.0,
+        }, index=index)
+        history.to_parquet(os.path.join(directory, 'history.parquet'))
+
+        dividend_dates = index[::63]
+        pd.DataFrame({'Dividends': np.round(rng.uniform(0.1, 0.5, len(dividend_dates)), 2)},
+                     index=dividend_dates).to_parquet(os.path.join(directory, 'dividends.parquet'))
+        info = {
+            'symbol': ticker,
+            'trailingPE': round(float(rng.uniform(10, 40)), 2),
+            'marketCap': int(close[-1] * 1e9),
+            'fiftyTwoWeekHigh': float(close[-252:].max()),
+            'fiftyTwoWeekLow': float(close[-252:].min()),
+        }
+        calendar = {'Earnings Date': [str((end + pd.Timedelta(days=30)).date())]}
+        news = [{
+            'title': f'{ticker} headline {i}',
+            'publisher': 'Fixture Wire',
+            'link': f'https://example.com/{ticker}/{i}',
+            'providerPublishTime': int(end.timestamp()) - i * 3600,
+            'type': 'STORY',
+            'relatedTickers': [ticker],
+        } for i in range(10)]
+        for name, value in (('info.json', info), ('calendar.json', calendar), ('news.json', news)):
+            with open(os.path.join(directory, name), 'w') as f:
+                json.dump(value, f)
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# MEASUREMENT
+# ─────────────────────────────────────────────────────────────────────────────
+def _peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def measure(fn, repeats, setup=None):
+    """Time `fn` `repeats` times, then once more under tracemalloc."""
+    times = []
+    for _ in range(repeats):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    fn()
+    after = tracemalloc.take_snapshot()
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+
+    return {
+        'repeats': repeats,
+        'wall_median_s': statistics.median(times),
+        'wall_min_s': min(times),
+        'wall_max_s': max(times),
+        'peak_rss_kb': _peak_rss_kb(),
+        'py_alloc_peak_bytes': alloc_peak,
+        'py_alloc_blocks_retained': retained,
+    }
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# BENCHMARKS
+# ─────────────────────────────────────────────────────────────────────────────
+def bench_tools(results, repeats):
+    import functions
+    from charts import chart_cache
+    from data_cache import history_cache
+    from fundamentals import fundamentals_cache
+
+    with open(CONFIG_PATH) as f:
+        tool_names = [tool['name'] for tool in json.load(f)]
+    missing = [name for name in tool_names if name not in TOOL_ARGS]
+    if missing:
+        raise SystemExit(f'No benchmark arguments for tools: {", ".join(missing)}')
+
+    def cold():
+        history_cache.clear()
+        chart_cache.clear()
+        fundamentals_cache.clear()
+        # Snapshots saved by the previous repeat would otherwise load from disk.
+        shutil.rmtree(fundamentals_cache.root, ignore_errors=True)
+
+    for name in tool_names:
+        fn = getattr(functions, name)
+        args = TOOL_ARGS[name]
+        results[f'tool.{name}.cold'] = measure(lambda: fn(**args), repeats, setup=cold)
+        results[f'tool.{name}.warm'] = measure(lambda: fn(**args), repeats)
+
+
+def bench_indicators(results, repeats, history):
+    import forecast
+    for years in (1, 10, 25):
+        frame = history.iloc[-years * 252:].reset_index()
+        results[f'indicators.{years}y'] = measure(
+            lambda: forecast.calculate_technical_indicators(frame.copy(), 'Close'), repeats)
+
+
+def bench_figures(results, repeats, history):
+    import forecast
+    frame = forecast.calculate_technical_indicators(history.reset_index(), 'Close')
+    results['figure.price'] = measure(
+        lambda: forecast.build_price_figure(frame, 'AAPL', True, True, True, True), repeats)
+
+
+def bench_prophet(results, repeats, history, forecast_years, new_bars=5):
+    """Fit, warm-start refit and predict; returns the warm vs cold refit and fast vs standard reports."""
+    import forecast
+    from forecast_store import summarize
+    from prophet_models import fit_prophet, predict_forecast, refit_report, stan_init
+    df_prophet = history[['Close']].reset_index()
+    df_prophet.columns = ['ds', 'y']
+    df_prophet['ds'] = df_prophet['ds'].dt.tz_localize(None)
+
+    results['prophet.fit'] = measure(lambda: fit_prophet(df_prophet), repeats)
+    model = fit_prophet(df_prophet)
+    # Refit after `new_bars` more days, starting from the model fitted without them.
+    previous = fit_prophet(df_prophet.iloc[:-new_bars])
+    init = stan_init(previous)
+    results['prophet.fit.warm'] = measure(lambda: fit_prophet(df_prophet, init=init), repeats)
+    for years in forecast_years:
+        results[f'prophet.predict.{years}y'] = measure(lambda: predict_forecast(model, years), repeats)
+        results[f'prophet.predict.{years}y.fast'] = measure(
+            lambda: predict_forecast(model, years, 'fast'), repeats)
+
+    prediction = predict_forecast(model, max(forecast_years))
+    results['figure.forecast'] = measure(
+        lambda: forecast.build_forecast_figure(df_prophet, prediction, 'AAPL', max(forecast_years)), repeats)
+    results['figure.components'] = measure(lambda: forecast.build_components_figure(prediction), repeats)
+
+    # Dashboard read of a precomputed forecast: metric cards, then the frame from disk.
+    from forecast_store import ForecastStore
+    from prophet_models import model_cache
+    store = ForecastStore(os.path.join(os.environ['STOCKBOT_DATA_DIR'], 'bench-forecasts'))
+    key = model_cache.key('AAPL', 'Close', df_prophet)
+    years = max(forecast_years)
+    store.put(key, years, prediction, len(model.history), df_prophet['y'].iloc[-1])
+    results['forecast_store.open'] = measure(lambda: store.open(key, years).summary(years), repeats)
+    results['forecast_store.frame'] = measure(
+        lambda: ForecastStore(store.root).open(key, years).frame(years), repeats)
+
+    # How far the fast mode's metric cards are from today's settings at the longest horizon.
+    years = max(forecast_years)
+    last_actual = df_prophet['y'].iloc[-1]
+    standard = summarize(prediction, len(model.history), last_actual, years)[str(years)]
+    fast_prediction = predict_forecast(model, years, 'fast')
+    fast = summarize(fast_prediction, len(model.history), last_actual, years)[str(years)]
+    fast_mode = {
+        'years': years,
+        'rows': {'standard': len(prediction), 'fast': len(fast_prediction)},
+        'standard': standard,
+        'fast': fast,
+    }
+    refit = refit_report(previous, df_prophet, horizon_days=years * 365)
+    return {'refit': refit, 'fast_mode': fast_mode}
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+# CHECKS
+# ─────────────────────────────────────────────────────────────────────────────
+def check_fundamentals_round_trip(tickers):
+    """Snapshots written to disk must load back with the same dividends."""
+    from fundamentals import FundamentalsCache, FundamentalsSnapshot
+
+    failures = []
+    cache = FundamentalsCache(os.path.join(os.environ['STOCKBOT_DATA_DIR'], 'check-fundamentals'))
+    for ticker in tickers:
+        snapshot = FundamentalsSnapshot.fetch(ticker)
+        cache._write(snapshot)
+        loaded = cache._read(ticker)
+        if loaded is None:
+            failures.append(f'{ticker}: saved snapshot does not load')
+        elif not loaded.dividends.equals(snapshot.dividends) or loaded.info != snapshot.info:
+            failures.append(f'{ticker}: snapshot changed in the round trip')
+    return failures
+
+
+def check_streaming_indicators(tickers, resume_bars=5):
+    """Streaming indicator states, built in one go or resumed from disk, must match the batch engine."""
+    from forecast import START, TODAY
+    from history_store import load_history_view
+    from indicators import IndicatorEngine
+    from streaming_indicators import IndicatorState, tracked_indicators
+
+    failures = []
+    for ticker in tickers:
+        view = load_history_view(ticker, START, TODAY)
+        dates, values = view.dates, view.column('Close')
+        engine = IndicatorEngine(values)
+        macd, signal, hist = engine.macd()
+        middle, upper, lower = engine.bollinger()
+        expected = {
+            'EMA_20': engine.ema(20)[-1], 'MACD': macd[-1], 'MACD_Signal': signal[-1], 'MACD_Hist': hist[-1],
+            'RSI': engine.rsi()[-1], 'BB_Middle': middle[-1], 'BB_Upper': upper[-1], 'BB_Lower': lower[-1],
+            '52W_High': np.nanmax(values[-252:]), '52W_Low': np.nanmin(values[-252:]),
+        }
+        path = os.path.join(os.environ['STOCKBOT_DATA_DIR'], f'check-indicators-{ticker}.json')
+        partial = IndicatorState()
+        partial.catch_up(dates[:-resume_bars], values[:-resume_bars])
+        partial.save(path)
+        for label, state in (('full', tracked_indicators(dates, values, path + '.full')),
+                             ('resumed', tracked_indicators(dates, values, path))):
+            actual = state.values()
+            for name, value in expected.items():
+                if not np.isclose(actual[name], value, rtol=1e-9, atol=1e-9, equal_nan=True):
+                    failures.append(f'{ticker} {label} {name}: streaming {actual[name]} vs batch {value}')
+    return failures
+
+
+def check(args):
+    fixtures = os.path.abspath(args.fixtures)
+    os.environ.setdefault('STOCKBOT_DATA_DIR', tempfile.mkdtemp(prefix='stockbot-check-'))
+    os.makedirs(os.environ['STOCKBOT_DATA_DIR'], exist_ok=True)
+
+    from providers import ReplayProvider, set_provider
+    set_provider(ReplayProvider(fixtures))
+    tickers = sorted(name for name in os.listdir(fixtures) if os.path.isdir(os.path.join(fixtures, name)))
+
+    failures = []
+    for name, fn in (('fundamentals round trip', check_fundamentals_round_trip),
+                     ('streaming indicators vs batch', check_streaming_indicators)):
+        problems = fn(tickers)
+        print(f'{name:45s} {"FAIL" if problems else "ok"}')
+        failures.extend(problems)
+    for problem in failures:
+        print(f'  {problem}')
+    if failures:
+        sys.exit(1)
+
+
+def compare(results, baseline, threshold):
+    """Return [(name, baseline_s, current_s)] for benchmarks slower than baseline by more than `threshold`."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and result['wall_median_s'] > previous['wall_median_s'] * (1 + threshold):
+            regressions.append((name, previous['wall_median_s'], result['wall_median_s']))
+    return regressions
+
+
+def run(args):
+    fixtures = os.path.abspath(args.fixtures)
+    out = os.path.abspath(args.out) if args.out else None
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    os.environ.setdefault('STOCKBOT_DATA_DIR', tempfile.mkdtemp(prefix='stockbot-bench-'))
+    os.makedirs(os.environ['STOCKBOT_DATA_DIR'], exist_ok=True)
+    # Tools may write files into the working directory; keep them out of the repo.
+    os.chdir(os.environ['STOCKBOT_DATA_DIR'])
+
+    from providers import ReplayProvider, set_provider
+    from singleflight import flights
+    provider = ReplayProvider(fixtures, latency_ms=args.latency_ms)
+    set_provider(provider)
+    history = provider.history('AAPL', period='max')
+    if history.empty:
+        raise SystemExit(f'No AAPL history under {fixtures}; run `python bench.py make-fixtures` first.')
+
+    results = {}
+    prophet_reports = {}
+    selected = set(args.only or ['tools', 'indicators', 'figures', 'prophet'])
+    if 'tools' in selected:
+        bench_tools(results, args.repeats)
+    if 'indicators' in selected:
+        bench_indicators(results, args.repeats, history)
+    if 'figures' in selected:
+        bench_figures(results, args.repeats, history)
+    if 'prophet' in selected:
+        prophet_reports = bench_prophet(results, args.prophet_repeats, history, args.forecast_years)
+
+    report = {
+        'meta': {
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'fixtures': fixtures,
+            'latency_ms': args.latency_ms,
+        },
+        'results': results,
+        'singleflight': flights.stats(),
+        'prophet_refit': prophet_reports.get('refit'),
+        'prophet_fast_mode': prophet_reports.get('fast_mode'),
+    }
+    for name, result in results.items():
+        print(f'{name:45s} {result["wall_median_s"] * 1000:10.2f} ms')
+    refit = prophet_reports.get('refit')
+    if refit:
+        print(f'warm refit {refit["warm_seconds"]:.2f}s vs cold {refit["cold_seconds"]:.2f}s, '
+              f'yhat drift mean {refit["drift_mean_pct"]:.3f}% max {refit["drift_max_pct"]:.3f}%')
+    fast_mode = prophet_reports.get('fast_mode')
+    if fast_mode:
+        standard, fast = fast_mode['standard'], fast_mode['fast']
+        print(f'fast mode at {fast_mode["years"]}y: {fast_mode["rows"]["fast"]} vs {fast_mode["rows"]["standard"]} rows, '
+              f'predicted ${fast["predicted_price"]:.2f} vs ${standard["predicted_price"]:.2f}, '
+              f'confidence {fast["confidence"]:.1f}% vs {standard["confidence"]:.1f}%')
+    if out:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        for name, before, after in regressions:
+            print(f'REGRESSION {name}: {before * 1000:.2f} ms -> {after * 1000:.2f} ms')
+        if regressions:
+            sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fixtures = commands.add_parser('make-fixtures', help='generate synthetic replay fixtures')
+    fixtures.add_argument('--out', default='fixtures')
+    fixtures.add_argument('--tickers', nargs='+', default=BENCH_TICKERS)
+    fixtures.add_argument('--years', type=int, default=25)
+
+    bench = commands.add_parser('run', help='run the benchmarks')
+    bench.add_argument('--fixtures', default='fixtures')
+    bench.add_argument('--out', help='write results as JSON to this file')
+    bench.add_argument('--baseline', help='JSON results to compare against')
+    bench.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before flagging (0.2 = 20%%)')
+    bench.add_argument('--repeats', type=int, default=5)
+    bench.add_argument('--prophet-repeats', type=int, default=1)
+    bench.add_argument('--forecast-years', type=int, nargs='+', default=list(range(1, 11)))
+    bench.add_argument('--latency-ms', type=float, default=0, help='latency injected into every provider call')
+    bench.add_argument('--only', nargs='+', choices=['tools', 'indicators', 'figures', 'prophet'])
+
+    checks = commands.add_parser('check', help='verify persisted state round-trips against the fixtures')
+    checks.add_argument('--fixtures', default='fixtures')
+
+    args = parser.parse_args()
+    if args.command == 'make-fixtures':
+        make_fixtures(args.out, [t.upper() for t in args.tickers], args.years)
+    elif args.command == 'check':
+        check(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
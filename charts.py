@@ -0,0 +1,53 @@
+import io
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from data_cache import require_history
+from lru import LRUCache
+
+CHART_CACHE_MAX_ENTRIES = 128
+
+_PERIOD_TITLES = {'1y': 'Last 12 Months'}
+
+
+class ChartCache(LRUCache):
+    """LRU cache of rendered chart bytes keyed by (ticker, period, as-of date, format)."""
+
+    def __init__(self, max_entries=CHART_CACHE_MAX_ENTRIES):
+        super().__init__(max_entries)
+
+
+chart_cache = ChartCache()
+
+
+def _render(data, ticker, period, fmt):
+    # A standalone Figure with an Agg canvas: no pyplot global state, so
+    # concurrent sessions can render at the same time.
+    fig = Figure(figsize=(10, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ax.plot(data.index, data.Close)
+    ax.set_title(f'{ticker} Stock Price Over {_PERIOD_TITLES.get(period, period)}')
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Stock Price ($)')
+    ax.grid(True)
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def render_price_chart(ticker, period='1y', fmt='png'):
+    """Return the closing-price chart for `ticker` as PNG or SVG bytes.
+
+    Renders once per ticker, period and last bar date; repeats are served from memory.
+    """
+    ticker = ticker.upper()
+    data = require_history(ticker, period)
+    as_of = data.index[-1].date().isoformat()
+    key = (ticker, period, as_of, fmt)
+    image = chart_cache.get(key)
+    if image is None:
+        image = _render(data, ticker, period, fmt)
+        chart_cache.put(key, image)
+    return image
@@ -0,0 +1,145 @@
+import json
+from collections import deque
+
+from payloads import estimate_tokens
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Most tokens of conversation history sent with a question, summary included.
+CONTEXT_TOKEN_BUDGET = 3000
+# The summary of compacted turns is kept under this many tokens.
+SUMMARY_TOKEN_BUDGET = 400
+# Turns (a user message and everything answering it) always sent verbatim.
+RECENT_TURNS = 3
+
+# Per-message overhead of the chat format (role, separators).
+_MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+
+
+def count_text_tokens(text):
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is None:
+        return estimate_tokens(text)
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding('cl100k_base')
+    return len(_encoding.encode(text))
+
+
+def count_tokens(messages):
+    """Tokens `messages` take up in a prompt (exact with tiktoken installed, estimated otherwise)."""
+    total = 0
+    for message in messages:
+        total += _MESSAGE_OVERHEAD_TOKENS + count_text_tokens(message.get('content'))
+        for call in message.get('tool_calls') or []:
+            total += count_text_tokens(call['function']['name']) + count_text_tokens(call['function']['arguments'])
+        if message.get('function_call'):
+            total += count_text_tokens(json.dumps(message['function_call']))
+    return total
+
+
+def split_turns(messages):
+    turns = []
+    for message in messages:
+        if message['role'] == 'user' or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def _is_answer(message):
+    # User questions and the assistant's final text; tool calls and their
+    # results are only needed while the turn is recent.
+    if message['role'] == 'user':
+        return True
+    return message['role'] == 'assistant' and bool(message.get('content')) \
+        and not message.get('tool_calls') and not message.get('function_call')
+
+
+def transcript(turns, limit=300):
+    lines = []
+    for turn in turns:
+        for message in turn:
+            if _is_answer(message):
+                speaker = 'User' if message['role'] == 'user' else 'Assistant'
+                lines.append(f"{speaker}: {message['content'][:limit]}")
+    return '\n'.join(lines)
+
+
+def extractive_summary(summary, turns):
+    """Fallback summarizer: the previous summary followed by a clipped transcript of `turns`."""
+    text = transcript(turns, limit=120)
+    return f'{summary}\n{text}' if summary else text
+
+
+class ConversationContext:
+    """A chat history kept within a token budget.
+
+    `messages` holds the turns still kept verbatim. history() returns what is
+    sent to the model: the running summary, older turns without their tool
+    calls and results, and the last RECENT_TURNS turns as they were. compact()
+    folds older turns into the summary once the history goes over budget.
+    `summarize(summary, turns)` returns the updated summary text.
+    """
+
+    def __init__(self, summarize=extractive_summary, budget=CONTEXT_TOKEN_BUDGET, recent_turns=RECENT_TURNS):
+        self.summarize = summarize
+        self.budget = budget
+        self.recent_turns = recent_turns
+        self.messages = []
+        self.summary = ''
+        # Prompt size of each completion request made in this conversation.
+        self.prompt_tokens = deque(maxlen=1000)
+
+    def _summary_messages(self):
+        if not self.summary:
+            return []
+        return [{'role': 'system', 'content': f'Summary of the earlier conversation:\n{self.summary}'}]
+
+    def _pruned(self):
+        turns = split_turns(self.messages)
+        old = [[m for m in turn if _is_answer(m)] for turn in turns[:-self.recent_turns]]
+        return old, turns[-self.recent_turns:]
+
+    def history(self):
+        old, recent = self._pruned()
+        head = self._summary_messages()
+
+        def flat():
+            return head + [m for turn in old + recent for m in turn]
+
+        # Over budget before compaction: drop the oldest turns from this
+        # prompt, never the last one.
+        while count_tokens(flat()) > self.budget and len(old) + len(recent) > 1:
+            if old:
+                old.pop(0)
+            else:
+                recent.pop(0)
+        return flat()
+
+    def over_budget(self):
+        old, recent = self._pruned()
+        return count_tokens(self._summary_messages() + [m for turn in old + recent for m in turn]) > self.budget
+
+    def compact(self):
+        """Fold every turn but the recent ones into the running summary if the history is over budget."""
+        turns = split_turns(self.messages)
+        if not self.over_budget() or len(turns) <= self.recent_turns:
+            return False
+        old, recent = turns[:-self.recent_turns], turns[-self.recent_turns:]
+        try:
+            summary = self.summarize(self.summary, old)
+        except Exception:
+            summary = extractive_summary(self.summary, old)
+        if count_text_tokens(summary) > SUMMARY_TOKEN_BUDGET:
+            # Keep the most recent part of an overlong summary.
+            summary = '…' + summary[-SUMMARY_TOKEN_BUDGET * 4:]
+        self.summary = summary
+        self.messages = [m for turn in recent for m in turn]
+        return True
@@ -1,7 +1,19 @@
 import json
+import queue
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
 import openai
 import streamlit as st
+from answer_cache import answer_cache, normalize_question
+from chat_context import SUMMARY_TOKEN_BUDGET, ConversationContext, count_text_tokens, count_tokens, transcript
 from functions import *
+from intent_router import intent_router
+from payloads import fit_to_budget, tool_budget
+from tool_executor import ToolExecutor
+from tracing import Trace, tracer
 
 openai.api_key = st.secrets["OPENAI_API_KEY"]
 
@@ -11,25 +23,416 @@ functions_relative_path = 'function_config.json'
 with open(functions_relative_path, 'r') as file:
     config_data = json.load(file)
 
-def run_chatbot():
-    available_functions = {
-        'get_stock_price': get_stock_price,
-        'calculate_SMA': calculate_SMA,
-        'calculate_EMA': calculate_EMA,
-        'calculate_RSI': calculate_RSI,
-        'calculate_MACD': calculate_MACD,
-        'plot_stock_price': plot_stock_price,
-        'compare_stock_prices': compare_stock_prices,
-        'average_volume': average_volume,
-        'get_dividend_info': get_dividend_info,
-        'get_stock_news': get_stock_news,
-        'calculate_daily_returns': calculate_daily_returns,
-        'get_pe_ratio': get_pe_ratio,
-        'get_52_week_high_low': get_52_week_high_low,
-        'get_market_cap': get_market_cap,
-        'get_next_earnings_date': get_next_earnings_date
-    }
+# The same definitions in the tools format, which lets the model request
+# several calls in one response.
+tools_config = [{'type': 'function', 'function': function} for function in config_data]
+# Prompt tokens the tool definitions add to every first completion.
+TOOLS_TOKENS = count_text_tokens(json.dumps(tools_config))
+
+available_functions = {
+    'get_stock_price': get_stock_price,
+    'calculate_SMA': calculate_SMA,
+    'calculate_EMA': calculate_EMA,
+    'calculate_RSI': calculate_RSI,
+    'calculate_MACD': calculate_MACD,
+    'plot_stock_price': plot_stock_price,
+    'compare_stock_prices': compare_stock_prices,
+    'average_volume': average_volume,
+    'get_dividend_info': get_dividend_info,
+    'get_stock_news': get_stock_news,
+    'calculate_daily_returns': calculate_daily_returns,
+    'get_pe_ratio': get_pe_ratio,
+    'get_52_week_high_low': get_52_week_high_low,
+    'get_market_cap': get_market_cap,
+    'get_next_earnings_date': get_next_earnings_date
+}
+
+# Questions answered at the same time when several are sent at once.
+MAX_CONCURRENT_QUESTIONS = 4
+
+# Shared by every session: arguments are bound from function_config.json and
+# calls run with per-tool timeouts, a global concurrency cap and a circuit breaker.
+tool_executor = ToolExecutor(available_functions, config_data)
+
+# Wording that points at an earlier answer ("what about its P/E?", "compare
+# them"); such a question waits for everything before it to be answered.
+_REFERS_BACK = re.compile(
+    r"\b(it|its|it's|they|them|their|those|these|that one|that stock|the same|same|previous|above|earlier|"
+    r"last one|the other|both)\b",
+    re.IGNORECASE
+)
+
+
+def _ignore(kind, value):
+    pass
+
+
+def refers_back(question):
+    return bool(_REFERS_BACK.search(question))
+
+
+def summarize_turns(summary, turns):
+    """Fold `turns` into the running conversation summary with one small completion."""
+    response = openai.ChatCompletion.create(
+        model=MODEL_NAME,
+        messages=[
+            {'role': 'system', 'content': "You keep a running summary of a conversation between a user and a "
+                                          "stock assistant. Merge the new exchanges into the summary. Keep the "
+                                          "tickers, figures and conclusions the user may refer back to. "
+                                          "At most 150 words."},
+            {'role': 'user', 'content': f"Current summary:\n{summary or '(none)'}\n\n"
+                                        f"New exchanges:\n{transcript(turns)}"}
+        ],
+        max_tokens=SUMMARY_TOKEN_BUDGET
+    )
+    return response['choices'][0]['message']['content']
+
+
+def _describe_call(call):
+    try:
+        args = json.loads(call['function']['arguments'] or '{}')
+    except ValueError:
+        args = {}
+    return f"{call['function']['name']}({', '.join(str(v) for v in args.values())})"
+
+
+def run_tool_calls(tool_calls, emit=_ignore):
+    """Run the model's tool calls through the tool executor; returns a ToolResult per call, in call order."""
+    for call in tool_calls:
+        emit('status', f"Running {_describe_call(call)}…")
+
+    def on_done(result):
+        call = next(c for c in tool_calls if c['id'] == result.call[0])
+        if result.source == 'live':
+            emit('status', f"{_describe_call(call)} done")
+        elif result.source == 'cached':
+            emit('status', f"{_describe_call(call)} failed ({result.error}); using the last good result")
+        else:
+            emit('status', f"{_describe_call(call)} failed: {result.error}")
+
+    results = tool_executor.run(
+        [(call['id'], call['function']['name'], call['function']['arguments']) for call in tool_calls],
+        on_done=on_done
+    )
+    emit('tools_done', None)
+    return results
+
+
+def stream_completion(emit, **kwargs):
+    """Stream a chat completion, emitting ('token', text) per content delta; returns the assembled message."""
+    content = []
+    tool_calls = {}
+    for chunk in openai.ChatCompletion.create(model=MODEL_NAME, stream=True, **kwargs):
+        if not chunk['choices']:
+            continue
+        delta = chunk['choices'][0].get('delta') or {}
+        if delta.get('content'):
+            content.append(delta['content'])
+            emit('token', delta['content'])
+        for part in delta.get('tool_calls') or []:
+            call = tool_calls.setdefault(part['index'], {'id': None, 'type': 'function',
+                                                         'function': {'name': '', 'arguments': ''}})
+            if part.get('id'):
+                call['id'] = part['id']
+            function = part.get('function') or {}
+            call['function']['name'] += function.get('name') or ''
+            call['function']['arguments'] += function.get('arguments') or ''
+
+    message = {'role': 'assistant', 'content': ''.join(content) or None}
+    if tool_calls:
+        message['tool_calls'] = [tool_calls[i] for i in sorted(tool_calls)]
+    return message
+
+
+def answer_question(history, user_question, emit=_ignore, trace=None):
+    """Answer one question given the conversation so far, without touching Streamlit.
+
+    Returns (messages, outputs): the messages to append to the conversation and
+    a list of (kind, value) items for render_outputs. Safe to run in a worker thread.
+    Repeated questions on unchanged data are answered from the answer cache.
+    Simple lookups recognised by the intent router skip the first completion.
+    All tool calls the model asks for in its first response run concurrently and
+    go back in a single follow-up completion. Progress is reported through
+    `emit(kind, value)` as it happens: 'token' for each piece of streamed answer
+    text, 'status' and 'tools_done' for tool execution, 'output' for rendered
+    items, 'ttft' with the seconds until the first of them and 'prompt_tokens'
+    before each completion request. Stage timings are added to `trace`.
+    """
+    trace = trace or Trace('chat')
+    started = time.perf_counter()
+    first_seen = []
+
+    def emit_visible(kind, value):
+        if not first_seen:
+            first_seen.append(True)
+            ttft = time.perf_counter() - started
+            trace.add('ttft', ttft, 0.0)
+            emit('ttft', ttft)
+        emit(kind, value)
+
+    def emit_stream(kind, value):
+        (emit_visible if kind == 'token' else emit)(kind, value)
+
+    user_message = {'role': 'user', 'content': user_question}
+    messages = [user_message]
+    outputs = []
+
+    def output(kind, value):
+        outputs.append((kind, value))
+        emit_visible('output', (kind, value))
 
+    # Answers to questions that don't lean on the conversation are cached,
+    # keyed on the tool calls they need and the as-of of the data they read.
+    cacheable = not refers_back(user_question)
+    normalized = normalize_question(user_question)
+    with trace.span('route'):
+        routed = intent_router.route(user_question)
+    if routed is not None:
+        calls = [routed]
+    else:
+        calls = answer_cache.resolution(normalized) if cacheable else None
+    cache_key = None
+    if cacheable and calls:
+        with trace.span('cache.lookup'):
+            cache_key = answer_cache.key(normalized, calls)
+            cached = answer_cache.get(cache_key) if cache_key is not None else None
+        if cached is not None:
+            trace.attrs['cache'] = 'hit'
+            emit('status', "Answered from cache")
+            emit('tools_done', None)
+            cached_messages, cached_outputs = cached
+            for kind, value in cached_outputs:
+                if kind == 'text':
+                    emit_visible('token', value)
+                else:
+                    emit_visible('output', (kind, value))
+            return list(cached_messages), list(cached_outputs)
+
+    if calls:
+        # A simple lookup, or a question answered before: call the tools
+        # directly instead of asking the model to pick them.
+        response_message = {
+            'role': 'assistant',
+            'content': None,
+            'tool_calls': [{'id': f'call_local_{uuid.uuid4().hex[:12]}', 'type': 'function',
+                            'function': {'name': function_name, 'arguments': json.dumps(function_args)}}
+                           for function_name, function_args in calls]
+        }
+    else:
+        emit('prompt_tokens', count_tokens(history + messages) + TOOLS_TOKENS)
+        picking = time.perf_counter()
+        with trace.span('llm.pick'):
+            response_message = stream_completion(
+                emit_stream,
+                messages=history + messages,
+                tools=tools_config,
+                tool_choice='auto'
+            )
+        if response_message.get('tool_calls'):
+            # A direct answer streams the whole reply; only a tool pick is what routing saves.
+            intent_router.record_llm_pick(time.perf_counter() - picking)
+
+    if response_message.get('tool_calls'):
+        tool_messages = []
+        needs_answer = False
+        failed = False
+        tool_calls = response_message['tool_calls']
+        with trace.span('tools'):
+            results = run_tool_calls(tool_calls, emit)
+        for call, result in zip(tool_calls, results):
+            function_name = call['function']['name']
+            function_response = result.value
+            trace.add(f'tool.{function_name}', result.seconds)
+            if result.source != 'live':
+                # Degraded answers are never cached.
+                failed = True
+            if result.source == 'error':
+                content = f"Error: {result.error}"
+                needs_answer = True
+
+            elif function_name == 'plot_stock_price':
+                output('image', function_response)
+                content = "The chart was shown to the user."
+
+            elif function_name == 'get_stock_news':
+                output('news', function_response)
+                content = "The headlines were shown to the user."
+
+            elif function_name == 'calculate_daily_returns':
+                daily_returns = pd.Series(
+                    {k: (float(v) if v != "NaN" else np.nan) for k, v in function_response.items()})
+                output('data', daily_returns)
+                content = "The daily returns were shown to the user."
+
+            else:
+                content = fit_to_budget(str(function_response), tool_budget(function_name))
+                needs_answer = True
+
+            if result.source == 'cached':
+                fetched = datetime.fromtimestamp(result.as_of).strftime('%Y-%m-%d %H:%M')
+                content = f"(Live data unavailable, {result.error}; result from {fetched}) {content}"
+                needs_answer = True
+
+            tool_messages.append({'role': 'tool', 'tool_call_id': call['id'], 'name': function_name,
+                                  'content': content})
+
+        # Charts, news and returns speak for themselves; only values the
+        # model has to explain cost a second round trip.
+        if needs_answer:
+            messages.append(response_message)
+            messages.extend(tool_messages)
+            emit('prompt_tokens', count_tokens(history + messages))
+            with trace.span('llm.answer'):
+                content = stream_completion(emit_stream, messages=history + messages)['content']
+            outputs.append(('text', content))
+            messages.append({'role': 'assistant', 'content': content})
+
+        if cacheable and not failed:
+            calls = [(call['function']['name'], json.loads(call['function']['arguments'] or '{}'))
+                     for call in response_message['tool_calls']]
+            with trace.span('cache.store'):
+                answer_cache.remember_resolution(normalized, calls)
+                cache_key = answer_cache.key(normalized, calls)
+                if cache_key is not None:
+                    answer_cache.put(cache_key, (list(messages), list(outputs)))
+
+    else:
+        outputs.append(('text', response_message['content']))
+        messages.append({'role': 'assistant', 'content': response_message['content']})
+    return messages, outputs
+
+
+def _answer_into(events, history, question, trace):
+    try:
+        events.put(('done', answer_question(history, question, lambda kind, value: events.put((kind, value)), trace)))
+    except Exception as e:
+        events.put(('error', e))
+
+
+def answer_questions(questions, context):
+    """Answer `questions`, yielding (question, events, trace) in the order they were asked.
+
+    `events` iterates over the (kind, value) progress events of that question
+    (see answer_question) as they arrive, ending with ('done', outputs) or
+    ('error', exception). Independent questions run concurrently, each seeing
+    the conversation as it stood before the batch, and their events are
+    buffered until the questions before them have been shown. A question that
+    refers back to earlier answers waits until every question before it has
+    finished and sees their answers. Answers are appended to the
+    ConversationContext `context` in order. Each question's Trace is left for
+    the caller to finish once the answer has been rendered.
+    """
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_QUESTIONS) as pool:
+        pending = []
+
+        def replay(question, events):
+            while True:
+                kind, value = events.get()
+                if kind == 'done':
+                    new_messages, outputs = value
+                    context.messages.extend(new_messages)
+                    yield kind, outputs
+                    return
+                if kind == 'error':
+                    # The question still counts as asked, so follow-ups keep their context.
+                    context.messages.append({'role': 'user', 'content': question})
+                    yield kind, value
+                    return
+                if kind == 'prompt_tokens':
+                    context.prompt_tokens.append(value)
+                yield kind, value
+
+        def drain():
+            for question, events, trace in pending:
+                stream = replay(question, events)
+                yield question, stream, trace
+                for _ in stream:
+                    pass
+            pending.clear()
+
+        for question in questions:
+            if pending and refers_back(question):
+                yield from drain()
+            events = queue.Queue()
+            trace = tracer.start('chat')
+            pool.submit(_answer_into, events, context.history(), question, trace)
+            pending.append((question, events, trace))
+        yield from drain()
+
+
+def render_news(articles):
+    st.text("Recent News Headlines:")
+    for article in articles:
+        st.write(f"Title: {article['title']}")
+        st.write(f"Publisher: {article['publisher']}")
+        st.write(f"Link: {article['link']}")
+        publish_time = datetime.utcfromtimestamp(article['providerPublishTime']).strftime(
+            '%Y-%m-%d %H:%M:%S')
+        st.write(f"Provider Publish Time: {publish_time}")
+        st.write(f"Type: {article['type']}")
+        if 'thumbnail' in article and 'resolutions' in article['thumbnail'] and \
+                article['thumbnail']['resolutions']:
+            st.image(article['thumbnail']['resolutions'][0]['url'], width=200)
+        individual_tickers = [ticker for ticker in article['relatedTickers'] if
+                              not (ticker.startswith('^') or ticker.endswith('=F'))]
+        st.write("Related Tickers: ", ", ".join(individual_tickers))
+        st.write("\n---\n")
+
+
+def render_outputs(outputs):
+    for kind, value in outputs:
+        if kind == 'image':
+            st.image(value)
+        elif kind == 'news':
+            render_news(value)
+        else:
+            st.write(value)
+
+
+def render_events(events, trace=None):
+    """Show one question's answer as it streams in: tool status, outputs, then the text.
+
+    Time spent drawing (not waiting for events) is added to `trace` as 'render'.
+    """
+    status = None
+    text = ''
+    placeholder = None
+    prompt_tokens = []
+    rendering = 0.0
+    for kind, value in events:
+        drawn = time.perf_counter()
+        if kind == 'status':
+            if status is None:
+                status = st.status("Running tools…")
+            status.write(value)
+        elif kind == 'tools_done' and status is not None:
+            status.update(label="Tools finished", state="complete")
+        elif kind == 'output':
+            render_outputs([value])
+        elif kind == 'token':
+            if placeholder is None:
+                placeholder = st.empty()
+            text += value
+            placeholder.markdown(text + "▌")
+        elif kind == 'prompt_tokens':
+            prompt_tokens.append(value)
+        elif kind == 'error':
+            if status is not None:
+                status.update(label="Tools failed", state="error")
+            st.error("Oops! Something went wrong. Please try a different query or check your input.")
+            st.error(f"An error occurred: {value}")
+        rendering += time.perf_counter() - drawn
+    drawn = time.perf_counter()
+    if placeholder is not None:
+        placeholder.markdown(text)
+    if prompt_tokens:
+        st.caption(f"Prompt tokens: {' + '.join(str(n) for n in prompt_tokens)}")
+    if trace is not None:
+        trace.attrs['prompt_tokens'] = prompt_tokens
+        trace.add('render', rendering + time.perf_counter() - drawn)
+
+
+def run_chatbot():
     faq_questions = [
         ("What can I ask the chatbot about?", "Feel free to inquire about a wide range of stock-related information, "
                                               "including current stock prices, daily returns, technical indicators, "
@@ -115,8 +518,8 @@ def run_chatbot():
     # Main layout
     col1, col2 = st.columns(2, gap="medium")
 
-    if 'messages' not in st.session_state:
-        st.session_state['messages'] = []
+    if 'context' not in st.session_state:
+        st.session_state['context'] = ConversationContext(summarize=summarize_turns)
 
     # Chatbot Section
     with col1:
@@ -138,100 +541,19 @@ def run_chatbot():
 
         # Process input when the button is clicked
         if submit_button and user_input:
-            try:
-                # Split user input into separate questions
-                user_questions = user_input.split('\n')
-                for user_question in user_questions:
-                    st.session_state['messages'].append({'role': 'user', 'content': user_question})
-
-                    response = openai.ChatCompletion.create(
-                        model=MODEL_NAME,
-                        messages=st.session_state['messages'],
-                        functions=config_data,
-                        function_call='auto'
-                    )
-
-                    response_message = response['choices'][0]['message']
-
-                    if isinstance(response_message, dict):
-                        if response_message.get('function_call'):
-                            function_name = response_message['function_call']['name']
-                            function_args = json.loads(response_message['function_call']['arguments'])
-                            # Check if the function requires a 'ticker' argument
-                            if function_name in ['get_stock_price', 'calculate_RSI', 'calculate_MACD',
-                                                 'plot_stock_price',
-                                                 'get_stock_news', 'calculate_daily_returns']:
-                                args_dict = {'ticker': function_args.get('ticker')}
-                            elif function_name in ['calculate_SMA', 'calculate_EMA']:
-                                args_dict = {'ticker': function_args.get('ticker'),
-                                             'window': function_args.get('window')}
-                            elif function_name == 'compare_stock_prices':
-                                args_dict = {'ticker1': function_args.get('ticker1'),
-                                             'ticker2': function_args.get('ticker2'),
-                                             'period': function_args.get('period')}
-                            elif function_name == 'average_volume':
-                                args_dict = {'ticker': function_args.get('ticker'),
-                                             'period': function_args.get('period')}
-                            elif function_name == 'get_dividend_info':
-                                args_dict = {'ticker': function_args.get('ticker')}
-
-                            function_to_call = available_functions[function_name]
-                            function_response = function_to_call(**args_dict)
-
-                            if function_name == 'plot_stock_price':
-                                st.image('stock.png')
-
-                            elif function_name == 'get_stock_news':
-                                st.text("Recent News Headlines:")
-                                for article in function_response:
-                                    st.write(f"Title: {article['title']}")
-                                    st.write(f"Publisher: {article['publisher']}")
-                                    st.write(f"Link: {article['link']}")
-                                    publish_time = datetime.utcfromtimestamp(article['providerPublishTime']).strftime(
-                                        '%Y-%m-%d %H:%M:%S')
-                                    st.write(f"Provider Publish Time: {publish_time}")
-                                    st.write(f"Type: {article['type']}")
-                                    if 'thumbnail' in article and 'resolutions' in article['thumbnail'] and \
-                                            article['thumbnail']['resolutions']:
-                                        st.image(article['thumbnail']['resolutions'][0]['url'], width=200)
-                                    individual_tickers = [ticker for ticker in article['relatedTickers'] if
-                                                          not (ticker.startswith('^') or ticker.endswith('=F'))]
-                                    st.write("Related Tickers: ", ", ".join(individual_tickers))
-                                    st.write("\n---\n")
-
-                            elif function_name == 'calculate_daily_returns':
-                                daily_returns = pd.Series(
-                                    {k: (float(v) if v != "NaN" else np.nan) for k, v in function_response.items()})
-                                st.write(daily_returns)
-
-                            else:
-                                st.session_state['messages'].append(response_message)
-                                st.session_state['messages'].append(
-                                    {
-                                        'role': 'function',
-                                        'name': function_name,
-                                        'content': function_response
-                                    }
-                                )
-                                second_response = openai.ChatCompletion.create(
-                                    model=MODEL_NAME,
-                                    messages=st.session_state['messages']
-                                )
-                                st.write(second_response['choices'][0]['message']['content'])
-                                st.session_state['messages'].append(
-                                    {'role': 'assistant',
-                                     'content': second_response['choices'][0]['message']['content']})
-
-                        else:
-                            st.write(response_message['content'])
-                            st.session_state['messages'].append(
-                                {'role': 'assistant', 'content': response_message['content']})
-                    else:
-                        st.write(response_message)
-                        st.session_state['messages'].append({'role': 'assistant', 'content': response_message})
-            except Exception as e:
-                st.error("Oops! Something went wrong. Please try a different query or check your input.")
-                st.error(f"An error occurred: {e}")
+            # Split user input into separate questions; independent ones are
+            # answered concurrently and shown in the order they were asked.
+            user_questions = [q for q in user_input.split('\n') if q.strip()]
+            context = st.session_state['context']
+            traces = []
+            for user_question, events, trace in answer_questions(user_questions, context):
+                render_events(events, trace)
+                tracer.finish(trace)
+                traces.append(trace)
+            st.session_state['last_traces'] = traces
+            # Once the answers are on screen, fold old turns into the summary
+            # if the history has outgrown its budget.
+            context.compact()
 
     # FAQ Section
     with col2:
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from periods import PERIOD_ORDER, align_tz, covers, slice_period
+from providers import NoDataError, get_provider
+from singleflight import flights
+
+HISTORY_TTL_SECONDS = 300
+HISTORY_MAX_ENTRIES = 256
+
+# Anything shorter than this is fetched as this period and sliced, so later
+# requests for the longer window hit the cache too.
+MIN_FETCH_PERIOD = '1y'
+
+
+def fetch_batch(tickers, period='1y', interval='1d', **kwargs):
+    """Download several tickers in one grouped request and return {ticker: frame}.
+
+    Tickers the provider returns no rows for are left out of the result.
+    """
+    tickers = [t.upper() for t in tickers]
+    if not tickers:
+        return {}
+    return get_provider().download(tickers, period=period, interval=interval, **kwargs)
+
+
+class HistoryCache:
+    """Process-wide TTL + LRU cache of daily OHLCV history keyed by (ticker, period).
+
+    Frames handed out are shared between callers and must be treated as read-only.
+    """
+
+    def __init__(self, ttl=HISTORY_TTL_SECONDS, max_entries=HISTORY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, ticker, period):
+        now = time.monotonic()
+        best_key = None
+        for key, (fetched_at, _) in list(self._entries.items()):
+            if now - fetched_at > self.ttl:
+                del self._entries[key]
+                continue
+            if key[0] != ticker or not covers(key[1], period):
+                continue
+            if key[1] == period:
+                best_key = key
+                break
+            if best_key is None or PERIOD_ORDER.index(key[1]) < PERIOD_ORDER.index(best_key[1]):
+                best_key = key
+        if best_key is None:
+            return None
+        self._entries.move_to_end(best_key)
+        data = self._entries[best_key][1]
+        return data if best_key[1] == period else slice_period(data, period)
+
+    def _store(self, key, data):
+        self._entries[key] = (time.monotonic(), data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, ticker, period='1y'):
+        ticker = ticker.upper()
+        with self._lock:
+            data = self._lookup(ticker, period)
+            if data is not None:
+                self.hits += 1
+                return data
+            self.misses += 1
+
+        fetch_period = period
+        if covers(MIN_FETCH_PERIOD, period):
+            fetch_period = MIN_FETCH_PERIOD
+        # Concurrent misses for the same ticker share one upstream request.
+        data = flights.do(('history', ticker, fetch_period), lambda: self._fetch(ticker, fetch_period))
+        if data.empty:
+            return data
+        return data if fetch_period == period else slice_period(data, period)
+
+    def peek(self, ticker, period='1y'):
+        """Return the cached history for `ticker`, or None; never fetches and isn't counted as a lookup."""
+        with self._lock:
+            return self._lookup(ticker.upper(), period)
+
+    def _fetch(self, ticker, period):
+        with self._lock:
+            # Another flight may have filled the entry since our lookup missed.
+            data = self._lookup(ticker, period)
+        if data is not None:
+            return data
+        data = get_provider().history(ticker, period=period)
+        if not data.empty:
+            with self._lock:
+                self._store((ticker, period), data)
+        return data
+
+    def get_many(self, tickers, period='1y'):
+        """Return {ticker: history}, fetching every cache miss in a single batched download."""
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+        result = {}
+        with self._lock:
+            for ticker in tickers:
+                data = self._lookup(ticker, period)
+                if data is not None:
+                    self.hits += 1
+                    result[ticker] = data
+            missing = [t for t in tickers if t not in result]
+            self.misses += len(missing)
+        if not missing:
+            return result
+
+        fetch_period = period
+        if covers(MIN_FETCH_PERIOD, period):
+            fetch_period = MIN_FETCH_PERIOD
+        fetched = flights.do(('history_batch', tuple(missing), fetch_period),
+                             lambda: self._fetch_batch(missing, fetch_period))
+        for ticker, data in fetched.items():
+            result[ticker] = data if fetch_period == period else slice_period(data, period)
+        return result
+
+    def _fetch_batch(self, tickers, period):
+        fetched = fetch_batch(tickers, period)
+        with self._lock:
+            for ticker, data in fetched.items():
+                self._store((ticker, period), data)
+        return fetched
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+history_cache = HistoryCache()
+
+
+def get_history(ticker, period='1y'):
+    """Return daily OHLCV history for `ticker`, served from the shared cache when possible."""
+    return history_cache.get(ticker, period)
+
+
+def cached_history(ticker, period='1y'):
+    """Return `ticker`'s history if the shared cache already holds it, else None."""
+    return history_cache.peek(ticker, period)
+
+
+def require_history(ticker, period='1y'):
+    """Like get_history, but raise NoDataError rather than return an empty frame for an unknown ticker."""
+    data = get_history(ticker, period)
+    if data.empty:
+        raise NoDataError(f'No price data for {ticker.upper()}.')
+    return data
+
+
+def get_histories(tickers, period='1y'):
+    """Return {ticker: history} for several tickers with at most one upstream request."""
+    return history_cache.get_many(tickers, period)
+
+
+def get_closes(tickers, period='1y'):
+    """Return an aligned wide frame of closing prices, one column per ticker."""
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    histories = get_histories(tickers, period)
+    closes = {t: histories[t].Close for t in tickers if t in histories}
+    if not closes:
+        return pd.DataFrame()
+    # Join on one timezone even if a provider hands back mixed indexes.
+    tz = next(iter(closes.values())).index.tz
+    closes = pd.DataFrame({t: align_tz(close, tz) for t, close in closes.items()})
+    return closes.dropna(how='all')
@@ -1,266 +1,92 @@
+import threading
 from datetime import date
 import pandas as pd
-from prophet import Prophet
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import streamlit as st
-import yfinance as yf
 import numpy as np
 
+from fundamentals import get_fundamentals
+from history_store import history_store, load_history_many, load_history_view
+from indicators import IndicatorEngine, indicator_snapshot
+from forecast_store import forecast_store
+from prophet_models import model_cache, predict_forecast
+from streaming_indicators import tracked_indicators
+from tracing import tracer
+
 START = "2000-01-01"
 TODAY = date.today().strftime("%Y-%m-%d")
 
-def run_forecast():
-    st.set_page_config(
-        page_title="Stock Prophet - AI Forecasting",
-        layout="wide",
-        initial_sidebar_state="expanded",
-        page_icon="📈"
-    )
-
-    st.markdown("""
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-
-        body, .stApp, .main {
-            background: #1e1e1e;  /* solid dark background across entire app */
-            font-family: 'Inter', sans-serif;
-        }
+POPULAR_STOCKS = {
+    "🏢 Tech Giants": ["AAPL", "MSFT", "GOOGL", "AMZN", "META", "TSLA", "NVDA", "NFLX"],
+    "💰 Finance": ["JPM", "BAC", "WFC", "GS", "MS", "C", "USB", "PNC"],
+    "🏭 Industrial": ["GE", "BA", "CAT", "MMM", "HON", "UPS", "FDX", "LMT"],
+    "🏥 Healthcare": ["JNJ", "PFE", "UNH", "ABBV", "MRK", "TMO", "ABT", "DHR"],
+    "🛒 Consumer": ["PG", "KO", "PEP", "WMT", "HD", "MCD", "NKE", "SBUX"],
+    "🏦 Crypto & Fintech": ["COIN", "SQ", "PYPL", "HOOD", "SOFI", "AFRM", "LC", "UPST"]
+}
 
-        .metric-card {
-            background: rgba(255, 255, 255, 0.05);
-            backdrop-filter: blur(5px);
-            border-radius: 12px;
-            padding: 16px;
-            margin: 8px 0;
-            border: 1px solid rgba(255, 255, 255, 0.1);
-        }
+ALL_STOCKS = [ticker for sublist in POPULAR_STOCKS.values() for ticker in sublist]
 
-        .title-container {
-            background: rgba(255, 255, 255, 0.05);
-            backdrop-filter: blur(5px);
-            border-radius: 16px;
-            padding: 24px;
-            margin: 16px 0;
-            text-align: center;
-            border: 1px solid rgba(255, 255, 255, 0.1);
-        }
 
-        .sidebar .sidebar-content {
-            background: rgba(255, 255, 255, 0.02);
-            backdrop-filter: blur(5px);
-        }
+def warm_universe(tickers=None):
+    """Bring the local history store up to date for the whole universe in grouped downloads."""
+    return load_history_many(tickers or ALL_STOCKS, START, TODAY)
 
-        .stSelectbox > div > div > div {
-            background: rgba(255, 255, 255, 0.05);
-            color: white;
-            border-radius: 8px;
-        }
 
-        .stButton > button {
-            background: linear-gradient(45deg, #00CC66, #FF6600);
-            color: white;
-            border: none;
-            border-radius: 20px;
-            padding: 10px 24px;
-            font-weight: 500;
-            font-size: 14px;
-            transition: all 0.2s ease;
-            box-shadow: 0 2px 12px 0 rgba(0, 0, 0, 0.5);
-        }
-
-        .stButton > button:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 4px 16px 0 rgba(0, 0, 0, 0.7);
-        }
-
-        h1, h2, h3 {
-            color: #FFFFFF;
-            font-weight: 700;
-        }
-
-        .stMetric {
-            background: rgba(255, 255, 255, 0.05);
-            backdrop-filter: blur(5px);
-            border-radius: 8px;
-            padding: 12px;
-            border: 1px solid rgba(255, 255, 255, 0.1);
-        }
-
-        table.dataframe td, table.dataframe th {
-            color: #fff;
-            background-color: rgba(30,30,30,0.8);
-        }
-    </style>
-    """, unsafe_allow_html=True)
-
-    # ─────────────────────────────────────────────────────────────────────────────
-    # TITLE SECTION
-    # ─────────────────────────────────────────────────────────────────────────────
-    st.markdown("""
-    <div class="title-container">
-        <h1 style="font-size: 2.8rem; margin-bottom: 8px;">📈 Stock Prophet</h1>
-        <p style="font-size: 1rem; color: rgba(255,255,255,0.8); margin: 0;">
-            AI-Powered Stock Forecasting & Technical Analysis
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
-
-    # ─────────────────────────────────────────────────────────────────────────────
-    # SIDEBAR CONFIGURATION
-    # ─────────────────────────────────────────────────────────────────────────────
-    st.sidebar.markdown("## ⚙️ Configuration")
-
-    popular_stocks = {
-        "🏢 Tech Giants": ["AAPL", "MSFT", "GOOGL", "AMZN", "META", "TSLA", "NVDA", "NFLX"],
-        "💰 Finance": ["JPM", "BAC", "WFC", "GS", "MS", "C", "USB", "PNC"],
-        "🏭 Industrial": ["GE", "BA", "CAT", "MMM", "HON", "UPS", "FDX", "LMT"],
-        "🏥 Healthcare": ["JNJ", "PFE", "UNH", "ABBV", "MRK", "TMO", "ABT", "DHR"],
-        "🛒 Consumer": ["PG", "KO", "PEP", "WMT", "HD", "MCD", "NKE", "SBUX"],
-        "🏦 Crypto & Fintech": ["COIN", "SQ", "PYPL", "HOOD", "SOFI", "AFRM", "LC", "UPST"]
-    }
-
-    all_stocks = [ticker for sublist in popular_stocks.values() for ticker in sublist]
-
-    selected_stock = st.sidebar.selectbox(
-        "🎯 Select Stock Symbol",
-        options=all_stocks,
-        index=0,
-        help="Choose a stock to analyze and forecast"
-    )
+@st.cache_resource(show_spinner=False)
+def start_universe_warmup():
+    # Runs once per server process; the first visitor doesn't wait for it.
+    thread = threading.Thread(target=warm_universe, daemon=True)
+    thread.start()
+    return thread
 
-    st.sidebar.markdown("### 📊 Analysis Settings")
-    data_column = st.sidebar.selectbox(
-        "Price Data",
-        ["Close", "Open", "High", "Low"],
-        index=0,
-        help="Select which price data to analyze"
-    )
 
-    forecast_years = st.sidebar.slider(
-        "Forecast Period (Years)",
-        min_value=1,
-        max_value=10,
-        value=2,
-        help="Number of years to forecast into the future"
-    )
+@st.cache_data(ttl=300, show_spinner=False)
+def screen_watchlist(tickers):
+    """Latest indicators for every ticker in `tickers`, computed in one vectorized pass."""
+    histories = load_history_many(list(tickers), START, TODAY)
+    closes = pd.DataFrame({t: h['Close'] for t, h in histories.items() if h is not None and not h.empty})
+    if closes.empty:
+        return closes
+    return indicator_snapshot(closes.sort_index())
 
-    st.sidebar.markdown("### 🔧 Technical Analysis Options")
-    show_ma = st.sidebar.checkbox("Moving Averages", value=True)
-    show_bollinger = st.sidebar.checkbox("Bollinger Bands", value=False)
-    show_rsi = st.sidebar.checkbox("RSI Indicator", value=False)
-    show_macd = st.sidebar.checkbox("MACD Indicator", value=True)
-    show_volume = st.sidebar.checkbox("Volume Analysis", value=True)
 
-    # ─────────────────────────────────────────────────────────────────────────────
-    # DATA LOADING & INDICATOR CALCULATIONS
-    # ─────────────────────────────────────────────────────────────────────────────
-    @st.cache_data(ttl=3600)
-    def load_stock_data(ticker):
-        try:
-            stock = yf.Ticker(ticker)
-            data = stock.history(start=START, end=TODAY)
-            info = stock.info
-            if data.empty:
-                return None, None
-            data.reset_index(inplace=True)
-            return data, info
-        except Exception as e:
-            st.error(f"Error loading data for {ticker}: {e}")
+def load_stock_data(ticker):
+    # The price history is memory-mapped from the local store, so it is shared
+    # between sessions and needs no Streamlit cache of its own.
+    try:
+        view = load_history_view(ticker, START, TODAY)
+        if view is None or len(view) == 0:
             return None, None
+        return view, get_fundamentals(ticker).info
+    except Exception as e:
+        st.error(f"Error loading data for {ticker}: {e}")
+        return None, None
 
-    def calculate_technical_indicators(df):
-        # MOVING AVERAGES
-        df['MA_20'] = df[data_column].rolling(window=20).mean()
-        df['MA_50'] = df[data_column].rolling(window=50).mean()
-        df['MA_200'] = df[data_column].rolling(window=200).mean()
-
-        # BOLLINGER BANDS
-        df['BB_Middle'] = df[data_column].rolling(window=20).mean()
-        bb_std = df[data_column].rolling(window=20).std()
-        df['BB_Upper'] = df['BB_Middle'] + (bb_std * 2)
-        df['BB_Lower'] = df['BB_Middle'] - (bb_std * 2)
-
-        # RSI (14‐day)
-        delta = df[data_column].diff()
-        gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-        rs = gain / loss
-        df['RSI'] = 100 - (100 / (1 + rs))
-
-        # MACD (12‐26 EMA) + Signal (9 EMA of MACD) + Histogram
-        ema12 = df[data_column].ewm(span=12, adjust=False).mean()
-        ema26 = df[data_column].ewm(span=26, adjust=False).mean()
-        macd_line = ema12 - ema26
-        signal_line = macd_line.ewm(span=9, adjust=False).mean()
-        df['MACD'] = macd_line
-        df['MACD_Signal'] = signal_line
-        df['MACD_Hist'] = df['MACD'] - df['MACD_Signal']
-
-        return df
 
-    # ─────────────────────────────────────────────────────────────────────────────
-    # LOAD DATA FOR SELECTED STOCK
-    # ─────────────────────────────────────────────────────────────────────────────
-    with st.spinner(f"🔄 Loading data for {selected_stock}..."):
-        stock_data, stock_info = load_stock_data(selected_stock)
+def calculate_technical_indicators(df, data_column):
+    # Same engine as the chatbot tools, so both report identical values.
+    engine = IndicatorEngine(df[data_column].to_numpy())
 
-    if stock_data is None:
-        st.error("❌ Unable to load stock data. Please try a different symbol.")
-        st.stop()
+    # MOVING AVERAGES
+    df['MA_20'] = engine.sma(20)
+    df['MA_50'] = engine.sma(50)
+    df['MA_200'] = engine.sma(200)
 
-    stock_data = calculate_technical_indicators(stock_data)
+    # BOLLINGER BANDS (the middle band is MA_20, reused from the engine)
+    df['BB_Middle'], df['BB_Upper'], df['BB_Lower'] = engine.bollinger(20, 2)
 
-    # ─────────────────────────────────────────────────────────────────────────────
-    # TOP METRICS ROW
-    # ─────────────────────────────────────────────────────────────────────────────
-    if stock_info:
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            current_price = stock_data[data_column].iloc[-1]
-            prev_price = stock_data[data_column].iloc[-2]
-            change = current_price - prev_price
-            change_pct = (change / prev_price) * 100
-            st.metric(
-                label=f"💲 Current {data_column}",
-                value=f"${current_price:.2f}",
-                delta=f"{change:.2f} ({change_pct:.2f}%)",
-                delta_color="normal"
-            )
-        with col2:
-            high_52w = stock_data[data_column].rolling(252).max().iloc[-1]
-            st.metric(label="📈 52W High", value=f"${high_52w:.2f}")
-        with col3:
-            low_52w = stock_data[data_column].rolling(252).min().iloc[-1]
-            st.metric(label="📉 52W Low", value=f"${low_52w:.2f}")
-        with col4:
-            avg_volume = stock_data['Volume'].rolling(30).mean().iloc[-1]
-            st.metric(label="📊 Avg Volume (30d)", value=f"{avg_volume / 1e6:.1f}M")
+    # RSI (14‐day, Wilder smoothing)
+    df['RSI'] = engine.rsi(14)
 
-    # ─────────────────────────────────────────────────────────────────────────────
-    # SHOW PRICE STATISTICS TABLE
-    # ─────────────────────────────────────────────────────────────────────────────
-    st.markdown("### 📑 Price Statistics")
-    stats_df = pd.DataFrame({
-        "Metric": ["Mean", "Median", "Std Dev", "Min", "Max"],
-        "Value": [
-            stock_data[data_column].mean(),
-            stock_data[data_column].median(),
-            stock_data[data_column].std(),
-            stock_data[data_column].min(),
-            stock_data[data_column].max()
-        ]
-    })
-    stats_df["Value"] = stats_df["Value"].map(lambda x: f"${x:.2f}")
-    st.dataframe(stats_df.style.set_properties(
-        **{"background-color": "#2a2a2a", "color": "#ffffff"}
-    ), use_container_width=True)
+    # MACD (12‐26 EMA) + Signal (9 EMA of MACD) + Histogram
+    df['MACD'], df['MACD_Signal'], df['MACD_Hist'] = engine.macd(12, 26, 9)
+
+    return df
 
-    # ─────────────────────────────────────────────────────────────────────────────
-    # MAIN PRICE & INDICATORS CHART
-    # ─────────────────────────────────────────────────────────────────────────────
-    st.markdown("## 📈 Stock Price & Indicators")
 
+def build_price_figure(stock_data, selected_stock, show_ma, show_rsi, show_macd, show_volume):
     # Determine how many subplots to show (candlestick always + any combination of RSI, MACD, Volume)
     n_rows = 1
     if show_rsi and show_volume and show_macd:
@@ -439,7 +265,354 @@ def run_forecast():
         fig.update_xaxes(showgrid=False, row=i, col=1, tickfont=dict(color="#DDD"), linecolor="#444444")
         fig.update_yaxes(showgrid=False, row=i, col=1, tickfont=dict(color="#DDD"), linecolor="#444444")
 
-    st.plotly_chart(fig, use_container_width=True)
+    return fig
+
+
+def build_forecast_figure(df_prophet, forecast, selected_stock, forecast_years):
+    fig_f = go.Figure()
+    # Historical (green)
+    fig_f.add_trace(
+        go.Scatter(
+            x=df_prophet['ds'],
+            y=df_prophet['y'],
+            mode="lines",
+            name="Historical",
+            line=dict(color="#00FF00", width=2),
+            hovertemplate="Historical: $%{y:.2f}<extra></extra>"
+        )
+    )
+    # Forecast (orange dashed)
+    fig_f.add_trace(
+        go.Scatter(
+            x=forecast['ds'],
+            y=forecast['yhat'],
+            mode="lines",
+            name="Forecast",
+            line=dict(color="#FFA500", width=2, dash="dash"),
+            hovertemplate="Forecast: $%{y:.2f}<extra></extra>"
+        )
+    )
+    # Upper & lower bounds (semi‐transparent red)
+    fig_f.add_trace(
+        go.Scatter(
+            x=forecast['ds'],
+            y=forecast['yhat_upper'],
+            mode="lines",
+            name="Upper Bound",
+            line=dict(color="rgba(255,0,0,0.2)"),
+            showlegend=False
+        )
+    )
+    fig_f.add_trace(
+        go.Scatter(
+            x=forecast['ds'],
+            y=forecast['yhat_lower'],
+            mode="lines",
+            name="Lower Bound",
+            line=dict(color="rgba(255,0,0,0.2)"),
+            fill="tonexty",
+            fillcolor="rgba(255,0,0,0.1)",
+            showlegend=False
+        )
+    )
+
+    fig_f.update_layout(
+        title=f"{selected_stock} Price Forecast ‒ Next {forecast_years} Years",
+        template="plotly_dark",
+        height=500,
+        xaxis_title="Date",
+        yaxis_title=f"Price ($)",
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        margin=dict(t=40, b=40, l=40, r=40),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    fig_f.update_xaxes(showgrid=False, linecolor="#444444", tickfont=dict(color="#DDD"))
+    fig_f.update_yaxes(showgrid=False, linecolor="#444444", tickfont=dict(color="#DDD"))
+    return fig_f
+
+
+def build_components_figure(forecast):
+    comp = make_subplots(
+        rows=3, cols=1,
+        subplot_titles=("Trend", "Yearly Seasonality", "Weekly Seasonality"),
+        vertical_spacing=0.08
+    )
+    comp.add_trace(
+        go.Scatter(
+            x=forecast['ds'],
+            y=forecast['trend'],
+            mode="lines",
+            name="Trend",
+            line=dict(color="#00FF00", width=2),
+            hovertemplate="Trend: $%{y:.2f}<extra></extra>"
+        ),
+        row=1, col=1
+    )
+    comp.add_trace(
+        go.Scatter(
+            x=forecast['ds'],
+            y=forecast['yearly'],
+            mode="lines",
+            name="Yearly",
+            line=dict(color="#FFA500", width=2),
+            hovertemplate="Yearly: %{y:.2f}<extra></extra>"
+        ),
+        row=2, col=1
+    )
+    comp.add_trace(
+        go.Scatter(
+            x=forecast['ds'],
+            y=forecast['weekly'],
+            mode="lines",
+            name="Weekly",
+            line=dict(color="#FF0000", width=2),
+            hovertemplate="Weekly: %{y:.2f}<extra></extra>"
+        ),
+        row=3, col=1
+    )
+    comp.update_layout(
+        template="plotly_dark",
+        height=750,
+        paper_bgcolor="rgba(0,0,0,0)",
+        plot_bgcolor="rgba(0,0,0,0)",
+        margin=dict(t=40, b=40, l=40, r=40),
+        showlegend=False
+    )
+    for r in range(1, 4):
+        comp.update_xaxes(showgrid=False, linecolor="#444444", tickfont=dict(color="#DDD"), row=r, col=1)
+        comp.update_yaxes(showgrid=False, linecolor="#444444", tickfont=dict(color="#DDD"), row=r, col=1)
+    return comp
+
+
+def run_forecast():
+    st.set_page_config(
+        page_title="Stock Prophet - AI Forecasting",
+        layout="wide",
+        initial_sidebar_state="expanded",
+        page_icon="📈"
+    )
+
+    st.markdown("""
+    <style>
+        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
+
+        body, .stApp, .main {
+            background: #1e1e1e;  /* solid dark background across entire app */
+            font-family: 'Inter', sans-serif;
+        }
+
+        .metric-card {
+            background: rgba(255, 255, 255, 0.05);
+            backdrop-filter: blur(5px);
+            border-radius: 12px;
+            padding: 16px;
+            margin: 8px 0;
+            border: 1px solid rgba(255, 255, 255, 0.1);
+        }
+
+        .title-container {
+            background: rgba(255, 255, 255, 0.05);
+            backdrop-filter: blur(5px);
+            border-radius: 16px;
+            padding: 24px;
+            margin: 16px 0;
+            text-align: center;
+            border: 1px solid rgba(255, 255, 255, 0.1);
+        }
+
+        .sidebar .sidebar-content {
+            background: rgba(255, 255, 255, 0.02);
+            backdrop-filter: blur(5px);
+        }
+
+        .stSelectbox > div > div > div {
+            background: rgba(255, 255, 255, 0.05);
+            color: white;
+            border-radius: 8px;
+        }
+
+        .stButton > button {
+            background: linear-gradient(45deg, #00CC66, #FF6600);
+            color: white;
+            border: none;
+            border-radius: 20px;
+            padding: 10px 24px;
+            font-weight: 500;
+            font-size: 14px;
+            transition: all 0.2s ease;
+            box-shadow: 0 2px 12px 0 rgba(0, 0, 0, 0.5);
+        }
+
+        .stButton > button:hover {
+            transform: translateY(-2px);
+            box-shadow: 0 4px 16px 0 rgba(0, 0, 0, 0.7);
+        }
+
+        h1, h2, h3 {
+            color: #FFFFFF;
+            font-weight: 700;
+        }
+
+        .stMetric {
+            background: rgba(255, 255, 255, 0.05);
+            backdrop-filter: blur(5px);
+            border-radius: 8px;
+            padding: 12px;
+            border: 1px solid rgba(255, 255, 255, 0.1);
+        }
+
+        table.dataframe td, table.dataframe th {
+            color: #fff;
+            background-color: rgba(30,30,30,0.8);
+        }
+    </style>
+    """, unsafe_allow_html=True)
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # TITLE SECTION
+    # ─────────────────────────────────────────────────────────────────────────────
+    st.markdown("""
+    <div class="title-container">
+        <h1 style="font-size: 2.8rem; margin-bottom: 8px;">📈 Stock Prophet</h1>
+        <p style="font-size: 1rem; color: rgba(255,255,255,0.8); margin: 0;">
+            AI-Powered Stock Forecasting & Technical Analysis
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # SIDEBAR CONFIGURATION
+    # ─────────────────────────────────────────────────────────────────────────────
+    st.sidebar.markdown("## ⚙️ Configuration")
+
+    start_universe_warmup()
+
+    selected_stock = st.sidebar.selectbox(
+        "🎯 Select Stock Symbol",
+        options=ALL_STOCKS,
+        index=0,
+        help="Choose a stock to analyze and forecast"
+    )
+
+    st.sidebar.markdown("### 📊 Analysis Settings")
+    data_column = st.sidebar.selectbox(
+        "Price Data",
+        ["Close", "Open", "High", "Low"],
+        index=0,
+        help="Select which price data to analyze"
+    )
+
+    forecast_years = st.sidebar.slider(
+        "Forecast Period (Years)",
+        min_value=1,
+        max_value=10,
+        value=2,
+        help="Number of years to forecast into the future"
+    )
+
+    fast_forecast = st.sidebar.checkbox(
+        "⚡ Fast forecast",
+        value=False,
+        help="Forecast trading days only (weekly beyond 3 years) with closed-form confidence bands"
+    )
+    forecast_mode = 'fast' if fast_forecast else 'standard'
+
+    st.sidebar.markdown("### 🔧 Technical Analysis Options")
+    show_ma = st.sidebar.checkbox("Moving Averages", value=True)
+    show_bollinger = st.sidebar.checkbox("Bollinger Bands", value=False)
+    show_rsi = st.sidebar.checkbox("RSI Indicator", value=False)
+    show_macd = st.sidebar.checkbox("MACD Indicator", value=True)
+    show_volume = st.sidebar.checkbox("Volume Analysis", value=True)
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # LOAD DATA FOR SELECTED STOCK
+    # ─────────────────────────────────────────────────────────────────────────────
+    trace = tracer.start('forecast', ticker=selected_stock, column=data_column, years=forecast_years,
+                         mode=forecast_mode)
+    st.session_state['last_traces'] = [trace]
+    with st.spinner(f"🔄 Loading data for {selected_stock}..."):
+        with trace.span('data.load'):
+            stock_view, stock_info = load_stock_data(selected_stock)
+
+    if stock_view is None:
+        tracer.finish(trace)
+        st.error("❌ Unable to load stock data. Please try a different symbol.")
+        st.stop()
+
+    with trace.span('indicators'):
+        stock_data = calculate_technical_indicators(stock_view.to_frame(), data_column)
+        live_indicators = tracked_indicators(
+            stock_view.dates,
+            stock_view.column(data_column),
+            history_store.indicator_state_path(selected_stock, data_column)
+        ).values()
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # TOP METRICS ROW
+    # ─────────────────────────────────────────────────────────────────────────────
+    if stock_info:
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            current_price = stock_data[data_column].iloc[-1]
+            prev_price = stock_data[data_column].iloc[-2]
+            change = current_price - prev_price
+            change_pct = (change / prev_price) * 100
+            st.metric(
+                label=f"💲 Current {data_column}",
+                value=f"${current_price:.2f}",
+                delta=f"{change:.2f} ({change_pct:.2f}%)",
+                delta_color="normal"
+            )
+        with col2:
+            high_52w = live_indicators['52W_High']
+            st.metric(label="📈 52W High", value=f"${high_52w:.2f}")
+        with col3:
+            low_52w = live_indicators['52W_Low']
+            st.metric(label="📉 52W Low", value=f"${low_52w:.2f}")
+        with col4:
+            avg_volume = stock_data['Volume'].rolling(30).mean().iloc[-1]
+            st.metric(label="📊 Avg Volume (30d)", value=f"{avg_volume / 1e6:.1f}M")
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # SHOW PRICE STATISTICS TABLE
+    # ─────────────────────────────────────────────────────────────────────────────
+    st.markdown("### 📑 Price Statistics")
+    stats_df = pd.DataFrame({
+        "Metric": ["Mean", "Median", "Std Dev", "Min", "Max"],
+        "Value": [
+            stock_data[data_column].mean(),
+            stock_data[data_column].median(),
+            stock_data[data_column].std(),
+            stock_data[data_column].min(),
+            stock_data[data_column].max()
+        ]
+    })
+    stats_df["Value"] = stats_df["Value"].map(lambda x: f"${x:.2f}")
+    st.dataframe(stats_df.style.set_properties(
+        **{"background-color": "#2a2a2a", "color": "#ffffff"}
+    ), use_container_width=True)
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # MAIN PRICE & INDICATORS CHART
+    # ─────────────────────────────────────────────────────────────────────────────
+    st.markdown("## 📈 Stock Price & Indicators")
+
+    with trace.span('figure.price'):
+        fig = build_price_figure(stock_data, selected_stock, show_ma, show_rsi, show_macd, show_volume)
+
+    with trace.span('render.price'):
+        st.plotly_chart(fig, use_container_width=True)
+
+    # ─────────────────────────────────────────────────────────────────────────────
+    # WATCHLIST SCREEN (the selected stock's sector)
+    # ─────────────────────────────────────────────────────────────────────────────
+    sector = next(name for name, tickers in POPULAR_STOCKS.items() if selected_stock in tickers)
+    st.markdown(f"### 🧮 {sector} Screen")
+    with trace.span('watchlist'):
+        snapshot = screen_watchlist(tuple(POPULAR_STOCKS[sector]))
+    if not snapshot.empty:
+        st.dataframe(snapshot.round(2), use_container_width=True)
 
     # ─────────────────────────────────────────────────────────────────────────────
     # FORECASTING SECTION
@@ -447,169 +620,69 @@ def run_forecast():
     st.markdown("## 🔮 AI Forecasting")
 
     # Prepare data for Prophet
-    df_prophet = stock_data[['Date', data_column]].copy()
-    df_prophet.columns = ['ds', 'y']
-    df_prophet['ds'] = df_prophet['ds'].dt.tz_localize(None)
-    df_prophet = df_prophet.dropna()
+    df_prophet = stock_view.prophet_frame(data_column)
 
     if len(df_prophet) < 100:
         st.warning("⚠️ Insufficient data for reliable forecasting. Need at least 100 data points.")
     else:
         with st.spinner("🤖 Generating AI forecast..."):
             try:
-                model = Prophet(
-                    changepoint_prior_scale=0.05,
-                    yearly_seasonality=True,
-                    weekly_seasonality=True,
-                    daily_seasonality=False,
-                    seasonality_mode='multiplicative'
-                )
-                model.fit(df_prophet)
-
-                future = model.make_future_dataframe(periods=forecast_years * 365, freq="D")
-                forecast = model.predict(future)
+                # Forecasts in the store (from forecast_batch.py or an earlier
+                # visit) are used as long as they were fitted on today's data.
+                # Otherwise fitted models are cached per ticker, column and
+                # training data, so reruns and other sessions only refit when
+                # new bars arrive.
+                with trace.span('forecast.store'):
+                    model_key = model_cache.key(selected_stock, data_column, df_prophet)
+                    stored = forecast_store.open(model_key, forecast_years, forecast_mode)
+                trace.attrs['precomputed'] = stored is not None
+                if stored is None:
+                    with trace.span('prophet.fit'):
+                        model_key, model = model_cache.get(selected_stock, data_column, df_prophet)
+                    with trace.span('prophet.predict'):
+                        forecast = model_cache.predict(model_key, model, forecast_years, predict_forecast,
+                                                       forecast_mode)
+                    stored = forecast_store.put(model_key, forecast_years, forecast, len(model.history),
+                                                df_prophet['y'].iloc[-1], forecast_mode)
+                summary = stored.summary(forecast_years)
 
                 # METRICS CARDS
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    last_actual = df_prophet['y'].iloc[-1]
-                    future_price = forecast['yhat'].iloc[-1]
-                    price_change = future_price - last_actual
-                    price_change_pct = (price_change / last_actual) * 100
                     st.metric(
                         label=f"Predicted Price ({forecast_years}Y)",
-                        value=f"${future_price:.2f}",
-                        delta=f"{price_change:.2f} ({price_change_pct:.1f}%)"
+                        value=f"${summary['predicted_price']:.2f}",
+                        delta=f"{summary['price_change']:.2f} ({summary['price_change_pct']:.1f}%)"
                     )
                 with col2:
-                    trend_slope = (forecast['trend'].iloc[-1] - forecast['trend'].iloc[-365]) / 365
-                    trend_direction = "📈 Bullish" if trend_slope > 0 else "📉 Bearish"
+                    trend_direction = "📈 Bullish" if summary['trend_slope'] > 0 else "📉 Bearish"
                     st.metric(label="Trend Direction", value=trend_direction)
                 with col3:
-                    uncertainty = forecast['yhat_upper'].iloc[-1] - forecast['yhat_lower'].iloc[-1]
-                    confidence = max(0, 100 - (uncertainty / future_price * 100))
-                    st.metric(label="Confidence Level", value=f"{confidence:.1f}%")
+                    st.metric(label="Confidence Level", value=f"{summary['confidence']:.1f}%")
+                st.caption(f"Forecast as of {stored.as_of}")
+
+                with trace.span('forecast.load'):
+                    forecast = stored.frame(forecast_years)
 
                 # FORECAST CHART
-                fig_f = go.Figure()
-                # Historical (green)
-                fig_f.add_trace(
-                    go.Scatter(
-                        x=df_prophet['ds'],
-                        y=df_prophet['y'],
-                        mode="lines",
-                        name="Historical",
-                        line=dict(color="#00FF00", width=2),
-                        hovertemplate="Historical: $%{y:.2f}<extra></extra>"
-                    )
-                )
-                # Forecast (orange dashed)
-                fig_f.add_trace(
-                    go.Scatter(
-                        x=forecast['ds'],
-                        y=forecast['yhat'],
-                        mode="lines",
-                        name="Forecast",
-                        line=dict(color="#FFA500", width=2, dash="dash"),
-                        hovertemplate="Forecast: $%{y:.2f}<extra></extra>"
-                    )
-                )
-                # Upper & lower bounds (semi‐transparent red)
-                fig_f.add_trace(
-                    go.Scatter(
-                        x=forecast['ds'],
-                        y=forecast['yhat_upper'],
-                        mode="lines",
-                        name="Upper Bound",
-                        line=dict(color="rgba(255,0,0,0.2)"),
-                        showlegend=False
-                    )
-                )
-                fig_f.add_trace(
-                    go.Scatter(
-                        x=forecast['ds'],
-                        y=forecast['yhat_lower'],
-                        mode="lines",
-                        name="Lower Bound",
-                        line=dict(color="rgba(255,0,0,0.2)"),
-                        fill="tonexty",
-                        fillcolor="rgba(255,0,0,0.1)",
-                        showlegend=False
-                    )
-                )
-
-                fig_f.update_layout(
-                    title=f"{selected_stock} Price Forecast ‒ Next {forecast_years} Years",
-                    template="plotly_dark",
-                    height=500,
-                    xaxis_title="Date",
-                    yaxis_title=f"Price ($)",
-                    paper_bgcolor="rgba(0,0,0,0)",
-                    plot_bgcolor="rgba(0,0,0,0)",
-                    margin=dict(t=40, b=40, l=40, r=40),
-                    legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
-                )
-                fig_f.update_xaxes(showgrid=False, linecolor="#444444", tickfont=dict(color="#DDD"))
-                fig_f.update_yaxes(showgrid=False, linecolor="#444444", tickfont=dict(color="#DDD"))
-
-                st.plotly_chart(fig_f, use_container_width=True)
+                with trace.span('figure.forecast'):
+                    fig_f = build_forecast_figure(df_prophet, forecast, selected_stock, forecast_years)
+
+                with trace.span('render.forecast'):
+                    st.plotly_chart(fig_f, use_container_width=True)
 
                 # FORECAST COMPONENTS (Trend / Yearly / Weekly)
                 st.markdown("### 🔍 Forecast Components Analysis")
-                comp = make_subplots(
-                    rows=3, cols=1,
-                    subplot_titles=("Trend", "Yearly Seasonality", "Weekly Seasonality"),
-                    vertical_spacing=0.08
-                )
-                comp.add_trace(
-                    go.Scatter(
-                        x=forecast['ds'],
-                        y=forecast['trend'],
-                        mode="lines",
-                        name="Trend",
-                        line=dict(color="#00FF00", width=2),
-                        hovertemplate="Trend: $%{y:.2f}<extra></extra>"
-                    ),
-                    row=1, col=1
-                )
-                comp.add_trace(
-                    go.Scatter(
-                        x=forecast['ds'],
-                        y=forecast['yearly'],
-                        mode="lines",
-                        name="Yearly",
-                        line=dict(color="#FFA500", width=2),
-                        hovertemplate="Yearly: %{y:.2f}<extra></extra>"
-                    ),
-                    row=2, col=1
-                )
-                comp.add_trace(
-                    go.Scatter(
-                        x=forecast['ds'],
-                        y=forecast['weekly'],
-                        mode="lines",
-                        name="Weekly",
-                        line=dict(color="#FF0000", width=2),
-                        hovertemplate="Weekly: %{y:.2f}<extra></extra>"
-                    ),
-                    row=3, col=1
-                )
-                comp.update_layout(
-                    template="plotly_dark",
-                    height=750,
-                    paper_bgcolor="rgba(0,0,0,0)",
-                    plot_bgcolor="rgba(0,0,0,0)",
-                    margin=dict(t=40, b=40, l=40, r=40),
-                    showlegend=False
-                )
-                for r in range(1, 4):
-                    comp.update_xaxes(showgrid=False, linecolor="#444444", tickfont=dict(color="#DDD"), row=r, col=1)
-                    comp.update_yaxes(showgrid=False, linecolor="#444444", tickfont=dict(color="#DDD"), row=r, col=1)
-
-                st.plotly_chart(comp, use_container_width=True)
+                with trace.span('figure.components'):
+                    comp = build_components_figure(forecast)
+
+                with trace.span('render.components'):
+                    st.plotly_chart(comp, use_container_width=True)
 
             except Exception as e:
+                trace.attrs['error'] = str(e)
                 st.error(f"❌ Forecasting error: {str(e)}")
+    tracer.finish(trace)
 
     # ─────────────────────────────────────────────────────────────────────────────
     # SUMMARY CARDS
@@ -0,0 +1,137 @@
+"""Precompute Prophet forecasts for the ticker universe on every core.
+
+Fits (warm-starting from the previous model when one exists) and predicts
+each ticker in a process pool and writes the results to the forecast store,
+where the dashboard picks them up instead of fitting on first view:
+
+    python forecast_batch.py                        # every ticker in POPULAR_STOCKS
+    python forecast_batch.py AAPL MSFT --years 5 --report batch.json
+    python forecast_batch.py --mode fast              # what the dashboard's fast mode reads
+
+Each worker runs Stan and the BLAS libraries single-threaded, so N workers
+use N cores without oversubscribing them. Exits non-zero if any ticker failed.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Environment variables that cap the threads each worker's native libraries start.
+THREAD_LIMIT_VARS = ('STAN_NUM_THREADS', 'OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS')
+MIN_HISTORY_ROWS = 100
+MAX_FORECAST_YEARS = 10
+
+
+def init_worker():
+    # Runs before the worker imports prophet, numpy's BLAS or cmdstanpy.
+    for name in THREAD_LIMIT_VARS:
+        os.environ[name] = '1'
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+
+
+def forecast_ticker(ticker, column, forecast_years, start, end, mode):
+    """Fit, predict and store one ticker's forecast; returns its timings."""
+    from forecast_store import forecast_store
+    from history_store import load_history_view
+    from prophet_models import model_cache, predict_forecast
+
+    timings = {}
+    started = time.perf_counter()
+    view = load_history_view(ticker, start, end)
+    if view is None or len(view) == 0:
+        raise ValueError('no price history')
+    df_prophet = view.prophet_frame(column)
+    if len(df_prophet) < MIN_HISTORY_ROWS:
+        raise ValueError(f'only {len(df_prophet)} rows of history')
+    timings['load_s'] = time.perf_counter() - started
+
+    fits = len(model_cache.fits)
+    started = time.perf_counter()
+    key, model = model_cache.get(ticker, column, df_prophet)
+    timings['fit_s'] = time.perf_counter() - started
+    fit = model_cache.fits[-1]['mode'] if len(model_cache.fits) > fits else 'cached'
+
+    started = time.perf_counter()
+    forecast = predict_forecast(model, forecast_years, mode)
+    timings['predict_s'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    forecast_store.put(key, forecast_years, forecast, len(model.history), df_prophet['y'].iloc[-1], mode)
+    timings['store_s'] = time.perf_counter() - started
+    return {'fit': fit, 'rows': len(df_prophet), **timings}
+
+
+def _run_one(ticker, column, forecast_years, start, end, mode):
+    started = time.perf_counter()
+    try:
+        result = forecast_ticker(ticker, column, forecast_years, start, end, mode)
+    except Exception as e:
+        result = {'error': f'{type(e).__name__}: {e}'}
+    return {'ticker': ticker, 'column': column, 'seconds': time.perf_counter() - started, **result}
+
+
+def run_batch(tickers, columns=('Close',), forecast_years=MAX_FORECAST_YEARS, workers=None, start=None, end=None,
+              mode='standard'):
+    """Forecast every (ticker, column) in a process pool and return the per-job report, in input order."""
+    from forecast import START, TODAY, warm_universe
+
+    start = start or START
+    end = end or TODAY
+    # One grouped download for the universe instead of one per worker.
+    warm_universe(tickers)
+
+    jobs = [(ticker, column) for ticker in tickers for column in columns]
+    workers = min(workers or os.cpu_count() or 1, len(jobs)) or 1
+    # Spawned (not forked) workers import the native libraries only after
+    # init_worker has capped their threads.
+    context = multiprocessing.get_context('spawn')
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker) as pool:
+        futures = {pool.submit(_run_one, ticker, column, forecast_years, start, end, mode): (ticker, column)
+                   for ticker, column in jobs}
+        for future in as_completed(futures):
+            result = future.result()
+            results[futures[future]] = result
+            status = result.get('error') or f"{result['fit']} fit {result['fit_s']:.2f}s"
+            print(f"{result['ticker']:6s} {result['column']:6s} {result['seconds']:7.2f}s  {status}", flush=True)
+    return [results[job] for job in jobs]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('tickers', nargs='*', help='tickers to forecast (default: every popular stock)')
+    parser.add_argument('--columns', nargs='+', default=['Close'], choices=['Close', 'Open', 'High', 'Low'])
+    parser.add_argument('--years', type=int, default=MAX_FORECAST_YEARS,
+                        help='forecast horizon; the dashboard serves any horizon up to this from the store')
+    parser.add_argument('--mode', default='standard', choices=['standard', 'fast'],
+                        help='forecast mode (see prophet_models.FORECAST_MODES)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--report', help='write the per-ticker report here as JSON')
+    args = parser.parse_args()
+
+    from forecast import ALL_STOCKS
+    tickers = [t.upper() for t in args.tickers] or ALL_STOCKS
+
+    started = time.perf_counter()
+    results = run_batch(tickers, args.columns, args.years, args.workers, mode=args.mode)
+    wall = time.perf_counter() - started
+    failed = [r for r in results if 'error' in r]
+    busy = sum(r['seconds'] for r in results)
+    print(f'{len(results) - len(failed)}/{len(results)} forecasts in {wall:.1f}s '
+          f'({busy:.1f}s of work, {busy / wall if wall else 0:.1f}x parallel)')
+    for result in failed:
+        print(f"FAILED {result['ticker']} {result['column']}: {result['error']}")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'wall_s': wall, 'years': args.years, 'mode': args.mode, 'results': results}, f, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+import json
+import os
+
+import pandas as pd
+
+from atomic_files import atomic_write
+from lru import LRUCache
+from prophet_models import DEFAULT_FORECAST_MODE, horizon_end
+from settings import DATA_DIR
+
+FORECASTS_DIR = os.path.join(DATA_DIR, 'forecasts')
+
+# What the dashboard draws; the rest of Prophet's output is not stored.
+FORECAST_COLUMNS = ['ds', 'yhat', 'yhat_lower', 'yhat_upper', 'trend', 'yearly', 'weekly']
+# Forecast frames kept in memory per process.
+FRAME_CACHE_MAX_ENTRIES = 32
+
+
+def _last_row(ds, date):
+    return int(ds.searchsorted(date, side='right')) - 1
+
+
+def summarize(forecast, history_rows, last_actual, forecast_years):
+    """Metric cards for each horizon of 1..forecast_years years: predicted price, trend slope, confidence.
+
+    Rows are found by date, so this works for daily, trading-day and weekly forecasts alike.
+    """
+    ds = forecast['ds']
+    as_of = ds.iloc[history_rows - 1]
+    summary = {}
+    for years in range(1, forecast_years + 1):
+        end = _last_row(ds, horizon_end(as_of, years))
+        year_before = _last_row(ds, ds.iloc[end] - pd.Timedelta(days=365))
+        future_price = float(forecast['yhat'].iloc[end])
+        uncertainty = float(forecast['yhat_upper'].iloc[end] - forecast['yhat_lower'].iloc[end])
+        days = max((ds.iloc[end] - ds.iloc[year_before]).days, 1)
+        summary[str(years)] = {
+            'predicted_price': future_price,
+            'price_change': future_price - last_actual,
+            'price_change_pct': (future_price - last_actual) / last_actual * 100,
+            'trend_slope': float(forecast['trend'].iloc[end] - forecast['trend'].iloc[year_before]) / days,
+            'confidence': max(0.0, 100 - uncertainty / future_price * 100),
+        }
+    return summary
+
+
+class StoredForecast:
+    """A stored forecast: summary metrics up front, the frame read only when asked for."""
+
+    def __init__(self, store, key, meta, frame=None):
+        self.store = store
+        self.key = key
+        self.meta = meta
+        self.as_of = meta['as_of']
+        self._frame = frame
+
+    def summary(self, forecast_years):
+        return self.meta['summary'][str(forecast_years)]
+
+    def frame(self, forecast_years):
+        """Return ds, yhat, bounds and components for the history plus `forecast_years`."""
+        if self._frame is None:
+            self._frame = self.store._read_frame(self.key, self.meta['mode'])
+        ds = self._frame['ds']
+        end = horizon_end(ds.iloc[self.meta['history_rows'] - 1], forecast_years)
+        return self._frame.iloc[:_last_row(ds, end) + 1]
+
+
+class ForecastStore:
+    """Precomputed Prophet forecasts, one columnar file per (ticker, column, model version, mode).
+
+    The model version is the hyperparameters-and-Prophet fingerprint, the
+    mode one of prophet_models.FORECAST_MODES. A small JSON meta file records
+    which forecast is newest (by the fingerprint of the data it was fitted
+    on), its horizon, its as-of date and the metric cards for every horizon,
+    so the dashboard can show those without touching the Parquet file. A
+    stored forecast serves any horizon up to its own as long as the data is
+    unchanged, since forecasts for fewer years are a prefix of longer ones.
+    """
+
+    def __init__(self, root=FORECASTS_DIR):
+        self.root = root
+        self._frames = LRUCache(FRAME_CACHE_MAX_ENTRIES)
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, f'ticker={ticker}')
+
+    def _path(self, key, mode):
+        ticker, column, params_key, data_key = key
+        return os.path.join(self._dir(ticker), f'{column}-{params_key}-{mode}-{data_key}.parquet')
+
+    def _meta_path(self, key, mode):
+        ticker, column, params_key, _ = key
+        return os.path.join(self._dir(ticker), f'{column}-{params_key}-{mode}.json')
+
+    def _read_meta(self, key, mode):
+        try:
+            with open(self._meta_path(key, mode)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _read_frame(self, key, mode):
+        frame = self._frames.get(key + (mode,))
+        if frame is None:
+            frame = pd.read_parquet(self._path(key, mode), columns=FORECAST_COLUMNS)
+            self._frames.put(key + (mode,), frame)
+        return frame
+
+    def open(self, key, forecast_years, mode=DEFAULT_FORECAST_MODE):
+        """Return the StoredForecast for model `key` and `mode` if it covers `forecast_years`, else None."""
+        meta = self._read_meta(key, mode)
+        if meta.get('data_key') != key[3] or meta.get('years', 0) < forecast_years:
+            return None
+        if not os.path.exists(self._path(key, mode)):
+            return None
+        return StoredForecast(self, key, meta)
+
+    def put(self, key, forecast_years, forecast, history_rows, last_actual, mode=DEFAULT_FORECAST_MODE):
+        """Store `forecast` (history plus `forecast_years` of predictions in `mode`) for model `key`.
+
+        Returns it as a StoredForecast. A stored forecast of the same data
+        with an equal or longer horizon is kept rather than overwritten.
+        """
+        frame = forecast[FORECAST_COLUMNS].reset_index(drop=True)
+        meta = {
+            'data_key': key[3],
+            'mode': mode,
+            'years': forecast_years,
+            'history_rows': history_rows,
+            'last_actual': float(last_actual),
+            'as_of': frame['ds'].iloc[history_rows - 1].strftime('%Y-%m-%d'),
+            'summary': summarize(frame, history_rows, float(last_actual), forecast_years),
+        }
+        previous = self._read_meta(key, mode)
+        if previous.get('data_key') == key[3] and previous.get('years', 0) >= forecast_years:
+            return StoredForecast(self, key, meta, frame)
+
+        os.makedirs(self._dir(key[0]), exist_ok=True)
+        with atomic_write(self._path(key, mode), 'wb') as f:
+            frame.to_parquet(f, index=False)
+        with atomic_write(self._meta_path(key, mode)) as f:
+            json.dump(meta, f)
+        self._frames.put(key + (mode,), frame)
+        if previous.get('data_key') and previous['data_key'] != key[3]:
+            try:
+                os.remove(self._path(key[:3] + (previous['data_key'],), mode))
+            except OSError:
+                pass
+        return StoredForecast(self, key, meta, frame)
+
+
+forecast_store = ForecastStore()
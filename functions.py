@@ -1,94 +1,93 @@
-import matplotlib.pyplot as plt
-import yfinance as yf
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
 
+from charts import render_price_chart
+from data_cache import get_closes, require_history
+from fundamentals import get_fundamentals
+from indicators import IndicatorEngine, indicator_snapshot
+from payloads import compact_series, dividends_by_year, estimate_tokens, tool_budget
+from providers import get_provider
+from singleflight import flights
+
 def get_stock_price(ticker):
-    return str(yf.Ticker(ticker).history(period='1y').iloc[-1].Close)
+    return str(require_history(ticker, '1y').iloc[-1].Close)
 
 
 def calculate_SMA(ticker, window):
-    data = yf.Ticker(ticker).history(period='1y').Close
-    return str(data.rolling(window=window).mean().iloc[-1])
+    data = require_history(ticker, '1y').Close
+    return str(IndicatorEngine(data).sma(window)[-1])
 
 
 def calculate_EMA(ticker, window):
-    data = yf.Ticker(ticker).history(period='1y').Close
-    return str(data.ewm(span=window, adjust=False).mean().iloc[-1])
+    data = require_history(ticker, '1y').Close
+    return str(IndicatorEngine(data).ema(window)[-1])
 
 
 def calculate_RSI(ticker):
-    data = yf.Ticker(ticker).history(period='1y').Close
-    delta = data.diff()
-    up = delta.clip(lower=0)
-    down = -1 * delta.clip(upper=0)
-    ema_up = up.ewm(com=14 - 1, adjust=False).mean()
-    ema_down = down.ewm(com=14 - 1, adjust=False).mean()
-    rs = ema_up / ema_down
-    return str(100 - (100 / (1 + rs)).iloc[-1])
+    data = require_history(ticker, '1y').Close
+    return str(IndicatorEngine(data).rsi()[-1])
 
 
 def calculate_MACD(ticker):
-    data = yf.Ticker(ticker).history(period='1y').Close
-    short_EMA = data.ewm(span=12, adjust=False).mean()
-    long_EMA = data.ewm(span=26, adjust=False).mean()
-    MACD = short_EMA - long_EMA
-    signal = MACD.ewm(span=9, adjust=False).mean()
-    MACD_histogram = MACD - signal
+    data = require_history(ticker, '1y').Close
+    MACD, signal, MACD_histogram = IndicatorEngine(data).macd()
     return f'{MACD[-1]}, {signal[-1]}, {MACD_histogram[-1]}'
 
 
 def plot_stock_price(ticker):
-    data = yf.Ticker(ticker).history(period='1y')
-    plt.figure(figsize=(10, 5))
-    plt.plot(data.index, data.Close)
-    plt.title(f'{ticker} Stock Price Over Last 12 Months')
-    plt.xlabel('Date')
-    plt.ylabel('Stock Price ($)')
-    plt.grid(True)
-    plt.savefig('stock.png')
-    plt.close()
-
-
-def compare_stock_prices(ticker1, ticker2, period):
-    data1 = yf.Ticker(ticker1).history(period=period).Close
-    data2 = yf.Ticker(ticker2).history(period=period).Close
-    return f"The closing prices for {ticker1} are {data1.tolist()} and for {ticker2} are {data2.tolist()}."
+    """Return a PNG chart of the ticker's closing price over the last year."""
+    return render_price_chart(ticker, '1y')
+
+
+def compare_stock_prices(tickers, period):
+    closes = get_closes(tickers, period)
+    if closes.empty:
+        return 'No price data found for ' + ', '.join(tickers) + '.'
+    # Latest indicators for every ticker in one vectorized pass, then summaries
+    # and a downsampled series per ticker instead of every close, so long
+    # periods don't blow up the follow-up completion.
+    snapshot = indicator_snapshot(closes, sma_windows=(20, 50))
+    indicators = '\n'.join(
+        f'{ticker} latest: ' + ', '.join(f'{name} {value:.2f}' for name, value in row.dropna().items())
+        for ticker, row in snapshot[['RSI', 'MACD_Hist', 'SMA_20', 'SMA_50']].iterrows()
+    )
+    missing = [t for t in dict.fromkeys(t.upper() for t in tickers) if t not in closes.columns]
+    notes = indicators + ''.join(f'\nNo price data for {ticker}.' for ticker in missing)
+    budget = (tool_budget('compare_stock_prices') - estimate_tokens(notes)) // len(closes.columns)
+    return '\n'.join(compact_series(closes[ticker], ticker, budget) for ticker in closes.columns) + '\n' + notes
 
 
 def average_volume(ticker, period):
-    data = yf.Ticker(ticker).history(period=period).Volume
+    data = require_history(ticker, period).Volume
     return str(data.mean())
 
 
 def get_dividend_info(ticker):
-    dividends = yf.Ticker(ticker).dividends
-    return str(dividends)
+    return dividends_by_year(get_fundamentals(ticker).dividends)
 
 
 def get_stock_news(ticker, num_articles=5):
-    news = yf.Ticker(ticker).news[:num_articles]
+    ticker = ticker.upper()
+    news = flights.do(('news', ticker), lambda: get_provider().news(ticker))[:num_articles]
     return news
 
 
 def calculate_daily_returns(ticker):
-    end = datetime.today().strftime('%Y-%m-%d')
-    start = (datetime.today() - timedelta(days=30)).strftime('%Y-%m-%d')
-    data = yf.download(ticker, start=start, end=end, progress=False)
-    data['Daily Return'] = data['Adj Close'].pct_change()
-    return {k.strftime('%Y-%m-%d'): (v if pd.notnull(v) else "NaN") for k, v in data['Daily Return'].to_dict().items()}
+    # history() is split/dividend adjusted, so Close already matches the old 'Adj Close'.
+    daily_returns = require_history(ticker, '1mo').Close.pct_change()
+    return {k.strftime('%Y-%m-%d'): (v if pd.notnull(v) else "NaN") for k, v in daily_returns.to_dict().items()}
 
 
 def get_pe_ratio(ticker):
     """Return the trailing P/E ratio for the given ticker."""
-    info = yf.Ticker(ticker).info
+    info = get_fundamentals(ticker).info
     return str(info.get('trailingPE'))
 
 
 def get_52_week_high_low(ticker):
     """Return the 52 week high and low prices for the ticker."""
-    info = yf.Ticker(ticker).info
+    info = get_fundamentals(ticker).info
     high = info.get('fiftyTwoWeekHigh')
     low = info.get('fiftyTwoWeekLow')
     return f"High: {high}, Low: {low}"
@@ -96,13 +95,10 @@ def get_52_week_high_low(ticker):
 
 def get_market_cap(ticker):
     """Return the market capitalization for the ticker."""
-    info = yf.Ticker(ticker).info
+    info = get_fundamentals(ticker).info
     return str(info.get('marketCap'))
 
 
 def get_next_earnings_date(ticker):
     """Return the next earnings date for the ticker if available."""
-    info = yf.Ticker(ticker).calendar
-    if 'Earnings Date' in info.index and not info.empty:
-        return str(info.loc['Earnings Date'][0])
-    return 'N/A'
+    return get_fundamentals(ticker).earnings_date or 'N/A'
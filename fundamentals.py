@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from atomic_files import atomic_write
+from providers import get_provider
+from settings import DATA_DIR
+from singleflight import flights
+
+FUNDAMENTALS_DIR = os.path.join(DATA_DIR, 'fundamentals')
+
+# Snapshots older than this are still served but refreshed in the background.
+FUNDAMENTALS_TTL_SECONDS = 6 * 3600
+# Snapshots older than this are too stale to serve and are refetched inline.
+FUNDAMENTALS_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+def _earnings_date(calendar):
+    # yfinance returns the calendar as a dict in recent releases and as a
+    # DataFrame indexed by field name in older ones.
+    if isinstance(calendar, dict):
+        dates = calendar.get('Earnings Date') or []
+        return str(dates[0]) if dates else None
+    if isinstance(calendar, pd.DataFrame) and not calendar.empty and 'Earnings Date' in calendar.index:
+        return str(calendar.loc['Earnings Date'].iloc[0])
+    return None
+
+
+def _calendar_dict(calendar):
+    if isinstance(calendar, pd.DataFrame):
+        calendar = calendar.iloc[:, 0].to_dict() if not calendar.empty else {}
+    return calendar or {}
+
+
+class FundamentalsSnapshot:
+    """Everything slow-moving we know about a ticker, fetched in one go."""
+
+    def __init__(self, ticker, info, calendar, dividends, earnings_date, fetched_at):
+        self.ticker = ticker
+        self.info = info
+        self.calendar = calendar
+        self.dividends = dividends
+        self.earnings_date = earnings_date
+        self.fetched_at = fetched_at
+
+    @classmethod
+    def fetch(cls, ticker):
+        provider = get_provider()
+        calendar = provider.calendar(ticker)
+        return cls(
+            ticker,
+            provider.info(ticker) or {},
+            _calendar_dict(calendar),
+            provider.dividends(ticker),
+            _earnings_date(calendar),
+            time.time()
+        )
+
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def _dividends_utc(self):
+        index = pd.DatetimeIndex(self.dividends.index)
+        if index.tz is None:
+            index = index.tz_localize('UTC')
+        return pd.Series(self.dividends.to_numpy(), index=index.tz_convert('UTC'))
+
+    def to_dict(self):
+        return {
+            'ticker': self.ticker,
+            'info': self.info,
+            'calendar': self.calendar,
+            # UTC, since local timestamps carry different offsets either side of DST.
+            'dividends': [[ts.isoformat(), float(v)] for ts, v in self._dividends_utc().items()],
+            'dividends_tz': str(self.dividends.index.tz) if getattr(self.dividends.index, 'tz', None) else None,
+            'earnings_date': self.earnings_date,
+            'fetched_at': self.fetched_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        index = pd.to_datetime([ts for ts, _ in data['dividends']], utc=True)
+        tz = data.get('dividends_tz')
+        index = index.tz_convert(tz) if tz else index.tz_localize(None)
+        dividends = pd.Series(
+            [v for _, v in data['dividends']],
+            index=pd.DatetimeIndex(index, name='Date'),
+            name='Dividends',
+            dtype=float
+        )
+        return cls(data['ticker'], data['info'], data['calendar'], dividends, data['earnings_date'], data['fetched_at'])
+
+
+class FundamentalsCache:
+    """Per-ticker snapshots kept in memory and on disk, refreshed stale-while-revalidate."""
+
+    def __init__(self, root=FUNDAMENTALS_DIR, ttl=FUNDAMENTALS_TTL_SECONDS, max_age=FUNDAMENTALS_MAX_AGE_SECONDS):
+        self.root = root
+        self.ttl = ttl
+        self.max_age = max_age
+        self._snapshots = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def _path(self, ticker):
+        return os.path.join(self.root, f'{ticker}.json')
+
+    def _read(self, ticker):
+        try:
+            with open(self._path(ticker)) as f:
+                return FundamentalsSnapshot.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, snapshot):
+        os.makedirs(self.root, exist_ok=True)
+        with atomic_write(self._path(snapshot.ticker)) as f:
+            json.dump(snapshot.to_dict(), f, default=str)
+
+    def _refresh(self, ticker):
+        # Inline and background refreshes of the same ticker share one fetch.
+        return flights.do(('fundamentals', ticker), lambda: self._fetch(ticker))
+
+    def _fetch(self, ticker):
+        snapshot = FundamentalsSnapshot.fetch(ticker)
+        with self._lock:
+            self._snapshots[ticker] = snapshot
+        self._write(snapshot)
+        return snapshot
+
+    def _refresh_in_background(self, ticker):
+        def run():
+            try:
+                self._refresh(ticker)
+            except Exception:
+                # Keep serving the stale snapshot; the next request retries.
+                pass
+            finally:
+                with self._lock:
+                    self._refreshing.discard(ticker)
+
+        with self._lock:
+            if ticker in self._refreshing:
+                return
+            self._refreshing.add(ticker)
+        threading.Thread(target=run, daemon=True).start()
+
+    def peek(self, ticker):
+        """Return the snapshot get() would serve without fetching, or None if it would have to fetch."""
+        ticker = ticker.upper()
+        with self._lock:
+            snapshot = self._snapshots.get(ticker)
+        if snapshot is None:
+            snapshot = self._read(ticker)
+            if snapshot is not None:
+                with self._lock:
+                    self._snapshots.setdefault(ticker, snapshot)
+        if snapshot is None or snapshot.age() > self.max_age:
+            return None
+        return snapshot
+
+    def get(self, ticker):
+        ticker = ticker.upper()
+        snapshot = self.peek(ticker)
+        if snapshot is None:
+            return self._refresh(ticker)
+        if snapshot.age() > self.ttl:
+            self._refresh_in_background(ticker)
+        return snapshot
+
+    def clear(self):
+        """Forget in-memory snapshots; the on-disk copies are kept."""
+        with self._lock:
+            self._snapshots.clear()
+
+
+fundamentals_cache = FundamentalsCache()
+
+
+def cached_fundamentals(ticker):
+    """Return the fundamentals snapshot for `ticker` if one is cached and fresh enough to serve, else None."""
+    return fundamentals_cache.peek(ticker)
+
+
+def get_fundamentals(ticker):
+    """Return the fundamentals snapshot for `ticker`, never blocking on a refresh once one exists."""
+    return fundamentals_cache.get(ticker)
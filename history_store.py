@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from atomic_files import atomic_write
+from data_cache import fetch_batch
+from ohlcv_store import open_ohlcv, write_ohlcv
+from periods import align_tz
+from providers import get_provider
+from settings import DATA_DIR
+from singleflight import flights
+
+HISTORY_DIR = os.path.join(DATA_DIR, 'history')
+
+# Number of already-stored bars re-downloaded on each update. If Yahoo has
+# restated any of them (split or dividend adjustment) the whole history is
+# rewritten, otherwise only the new bars are appended.
+OVERLAP_BARS = 10
+
+_COMPARE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+
+def _overlap_matches(stored, fresh):
+    if not stored.index.equals(fresh.index):
+        return False
+    columns = [c for c in _COMPARE_COLUMNS if c in stored.columns and c in fresh.columns]
+    return np.allclose(
+        stored[columns].to_numpy(dtype=float),
+        fresh[columns].to_numpy(dtype=float),
+        rtol=1e-6,
+        equal_nan=True
+    )
+
+
+def _overlap_start(stored):
+    return stored.index[-OVERLAP_BARS:][0].strftime('%Y-%m-%d')
+
+
+class HistoryStore:
+    """Daily OHLCV history persisted as Parquet, one partition directory per ticker."""
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, ticker):
+        with self._locks_guard:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, f'ticker={ticker}')
+
+    def _ohlcv_path(self, ticker):
+        return os.path.join(self._dir(ticker), 'history.ohlcv')
+
+    def indicator_state_path(self, ticker, column):
+        return os.path.join(self._dir(ticker.upper()), f'indicators_{column}.json')
+
+    def _meta_path(self, ticker):
+        return os.path.join(self._dir(ticker), 'meta.json')
+
+    def read(self, ticker):
+        path = os.path.join(self._dir(ticker.upper()), 'history.parquet')
+        if not os.path.exists(path):
+            return None
+        return pd.read_parquet(path)
+
+    def _read_meta(self, ticker):
+        try:
+            with open(self._meta_path(ticker)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, ticker, data, checked):
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        with atomic_write(os.path.join(self._dir(ticker), 'history.parquet'), 'wb') as f:
+            data.to_parquet(f)
+        write_ohlcv(self._ohlcv_path(ticker), data)
+        self._write_meta(ticker, checked)
+
+    def _write_meta(self, ticker, checked):
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        with atomic_write(self._meta_path(ticker)) as f:
+            json.dump({'checked': checked}, f)
+
+    def _is_current(self, ticker, stored, end):
+        return stored is not None and not stored.empty and self._read_meta(ticker).get('checked') == end
+
+    def _apply(self, ticker, stored, fresh, end):
+        """Fold downloaded bars into the stored history and persist the result.
+
+        Returns None when the overlap window was restated upstream and the
+        ticker has to be reloaded from scratch.
+        """
+        if stored is None or stored.empty:
+            if not fresh.empty:
+                self._write(ticker, fresh, end)
+            return fresh
+        if fresh.empty:
+            return stored
+
+        fresh = align_tz(fresh, stored.index.tz)
+        overlap = stored.iloc[-OVERLAP_BARS:]
+        last = stored.index[-1]
+        if not _overlap_matches(overlap, fresh.loc[(fresh.index >= overlap.index[0]) & (fresh.index <= last)]):
+            return None
+
+        new_bars = fresh.loc[fresh.index > last]
+        if new_bars.empty:
+            self._write_meta(ticker, end)
+            return stored
+        data = pd.concat([stored, new_bars])
+        self._write(ticker, data, end)
+        return data
+
+    def load(self, ticker, start, end):
+        """Return history for `ticker` from `start` up to (not including) `end`.
+
+        Only bars after the last stored one are downloaded, plus a small overlap
+        window used to detect restatements. A ticker is checked at most once per
+        `end`, and concurrent loads of the same ticker share one read and update.
+        """
+        ticker = ticker.upper()
+        return flights.do(('history_store', ticker, start, end), lambda: self._load(ticker, start, end))
+
+    def _load(self, ticker, start, end):
+        with self._lock(ticker):
+            stored = self.read(ticker)
+            if self._is_current(ticker, stored, end):
+                return stored
+            if stored is None or stored.empty:
+                return self._apply(ticker, None, get_provider().history(ticker, start=start, end=end), end)
+
+            fresh = get_provider().history(ticker, start=_overlap_start(stored), end=end)
+            data = self._apply(ticker, stored, fresh, end)
+            if data is None:
+                # Prices were restated upstream; the stored bars are stale.
+                data = self._apply(ticker, None, get_provider().history(ticker, start=start, end=end), end)
+                if data.empty:
+                    return stored
+            return data
+
+    def load_many(self, tickers, start, end):
+        """Bring several tickers up to date with grouped downloads and return {ticker: history}.
+
+        Stored tickers are refreshed in one request and unknown or restated ones
+        are loaded in a second, however many tickers are passed.
+        """
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+        result = {}
+        stale = {}
+        for ticker in tickers:
+            stored = self.read(ticker)
+            if self._is_current(ticker, stored, end):
+                result[ticker] = stored
+            else:
+                stale[ticker] = stored
+
+        reload = [t for t, stored in stale.items() if stored is None or stored.empty]
+        updating = [t for t in stale if t not in reload]
+        if updating:
+            since = min(_overlap_start(stale[t]) for t in updating)
+            fetched = fetch_batch(updating, period=None, start=since, end=end)
+            for ticker in updating:
+                with self._lock(ticker):
+                    data = self._apply(ticker, stale[ticker], fetched.get(ticker, pd.DataFrame()), end)
+                if data is None:
+                    reload.append(ticker)
+                else:
+                    result[ticker] = data
+
+        if reload:
+            fetched = fetch_batch(reload, period=None, start=start, end=end)
+            for ticker in reload:
+                if ticker in fetched:
+                    with self._lock(ticker):
+                        result[ticker] = self._apply(ticker, None, fetched[ticker], end)
+                elif stale[ticker] is not None and not stale[ticker].empty:
+                    result[ticker] = stale[ticker]
+        return result
+
+    def open_view(self, ticker, start, end):
+        """Return a memory-mapped OHLCVView of `ticker`, refreshing the store first if needed.
+
+        When the store was already checked for `end` this touches only the small
+        meta file and maps the columnar mirror; no Parquet is read.
+        """
+        ticker = ticker.upper()
+        path = self._ohlcv_path(ticker)
+        if self._read_meta(ticker).get('checked') != end or not os.path.exists(path):
+            data = self.load(ticker, start, end)
+            if data is None or data.empty:
+                return None
+            if not os.path.exists(path):
+                with self._lock(ticker):
+                    write_ohlcv(path, data)
+        return open_ohlcv(path)
+
+
+history_store = HistoryStore()
+
+
+def load_history_view(ticker, start, end=None):
+    """Return a zero-copy OHLCVView of the stored daily history for `ticker`."""
+    return history_store.open_view(ticker, start, end or date.today().strftime('%Y-%m-%d'))
+
+
+def load_history_many(tickers, start, end=None):
+    """Return {ticker: history} for several tickers using grouped downloads."""
+    return history_store.load_many(tickers, start, end or date.today().strftime('%Y-%m-%d'))
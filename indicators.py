@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+
+RSI_PERIOD = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BOLLINGER_WINDOW = 20
+BOLLINGER_K = 2
+
+
+class IndicatorEngine:
+    """Technical indicators over a (time x tickers) price matrix.
+
+    Accepts a 1-D series or a 2-D array with one column per ticker and returns
+    arrays of the same shape. Leading NaNs (tickers with shorter histories in a
+    wide frame) are handled per column. Intermediate results such as running
+    sums and EMAs are computed once and shared between indicators, so e.g.
+    Bollinger bands reuse the 20-day SMA and MACD reuses any EMA already built.
+
+    RSI uses Wilder smoothing (an EMA with alpha = 1 / period).
+    """
+
+    def __init__(self, prices):
+        values = np.asarray(prices, dtype=np.float64)
+        self._one_dimensional = values.ndim == 1
+        self.values = values.reshape(len(values), -1)
+        self._ewm = {}
+        self._sums = None
+
+    def _shape(self, result):
+        return result[:, 0] if self._one_dimensional else result
+
+    def _ewm_mean(self, values, key, **kwargs):
+        if key not in self._ewm:
+            self._ewm[key] = pd.DataFrame(values).ewm(adjust=False, **kwargs).mean().to_numpy()
+        return self._ewm[key]
+
+    def _running_sums(self):
+        # Cumulative sums of the column-centred values and their squares, with a
+        # leading zero row, so any window's sum is one subtraction. Centring keeps
+        # the sum-of-squares variance formula numerically stable.
+        if self._sums is None:
+            valid = ~np.isnan(self.values)
+            with np.errstate(all='ignore'):
+                center = np.where(valid.any(axis=0), np.nanmean(np.where(valid, self.values, np.nan), axis=0), 0.0)
+            centred = np.where(valid, self.values - center, 0.0)
+            zeros = np.zeros((1, self.values.shape[1]))
+            self._sums = (
+                center,
+                np.vstack([zeros, np.cumsum(centred, axis=0)]),
+                np.vstack([zeros, np.cumsum(centred * centred, axis=0)]),
+                np.vstack([zeros, np.cumsum(valid, axis=0)]),
+            )
+        return self._sums
+
+    def _window(self, cumulative, window):
+        result = np.full((len(self.values), cumulative.shape[1]), np.nan)
+        if window <= len(self.values):
+            result[window - 1:] = cumulative[window:] - cumulative[:-window]
+        return result
+
+    def _rolling_moments(self, window):
+        center, sums, squares, counts = self._running_sums()
+        full = self._window(counts, window) == window
+        total = self._window(sums, window)
+        mean = np.where(full, total / window + center, np.nan)
+        return full, total, self._window(squares, window), mean
+
+    def sma(self, window):
+        return self._shape(self._rolling_moments(window)[3])
+
+    def rolling_std(self, window):
+        """Sample standard deviation over `window` bars, as pandas' rolling().std()."""
+        full, total, squares, _ = self._rolling_moments(window)
+        variance = np.maximum(squares - total * total / window, 0.0) / (window - 1)
+        return self._shape(np.where(full, np.sqrt(variance), np.nan))
+
+    def ema(self, span):
+        return self._shape(self._ewm_mean(self.values, ('ema', span), span=span))
+
+    def rsi(self, period=RSI_PERIOD):
+        delta = np.vstack([np.full((1, self.values.shape[1]), np.nan), np.diff(self.values, axis=0)])
+        up = np.where(np.isnan(delta), np.nan, np.maximum(delta, 0.0))
+        down = np.where(np.isnan(delta), np.nan, np.maximum(-delta, 0.0))
+        avg_up = self._ewm_mean(up, ('rsi_up', period), alpha=1.0 / period)
+        avg_down = self._ewm_mean(down, ('rsi_down', period), alpha=1.0 / period)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = avg_up / avg_down
+            return self._shape(100 - 100 / (1 + rs))
+
+    def macd(self, fast=MACD_FAST, slow=MACD_SLOW, signal=MACD_SIGNAL):
+        """Return (MACD line, signal line, histogram)."""
+        line = self._ewm_mean(self.values, ('ema', fast), span=fast) - \
+            self._ewm_mean(self.values, ('ema', slow), span=slow)
+        signal_line = self._ewm_mean(line, ('macd_signal', fast, slow, signal), span=signal)
+        return self._shape(line), self._shape(signal_line), self._shape(line - signal_line)
+
+    def bollinger(self, window=BOLLINGER_WINDOW, k=BOLLINGER_K):
+        """Return (middle, upper, lower) bands."""
+        middle = self.sma(window)
+        width = self.rolling_std(window) * k
+        return middle, middle + width, middle - width
+
+
+def indicator_snapshot(closes, sma_windows=(20, 50, 200)):
+    """Latest indicator values for a wide Close frame (one column per ticker), one row per ticker."""
+    engine = IndicatorEngine(closes.to_numpy())
+    line, signal, hist = engine.macd()
+    _, upper, lower = engine.bollinger()
+    columns = {f'SMA_{w}': engine.sma(w) for w in sma_windows}
+    columns.update({
+        'RSI': engine.rsi(),
+        'MACD': line,
+        'MACD_Signal': signal,
+        'MACD_Hist': hist,
+        'BB_Upper': upper,
+        'BB_Lower': lower,
+    })
+    snapshot = pd.DataFrame({name: values[-1] for name, values in columns.items()}, index=closes.columns)
+    snapshot.index.name = 'Ticker'
+    return snapshot
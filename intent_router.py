@@ -0,0 +1,159 @@
+import re
+import threading
+import time
+
+# Upper-case words that look like tickers but are not.
+_NOT_TICKERS = {
+    'A', 'I', 'AM', 'AN', 'AND', 'ARE', 'AT', 'BY', 'DO', 'FOR', 'HOW', 'IN', 'IS', 'IT', 'ME', 'MY', 'OF', 'ON',
+    'OR', 'THE', 'TO', 'WHAT', 'WHEN', 'US', 'USD', 'ETF', 'CEO', 'IPO', 'EPS', 'RSI', 'MACD', 'SMA', 'EMA', 'PE',
+    'P', 'E', 'YTD', 'MAX', 'NEWS', 'OK',
+}
+_TICKER = re.compile(r'(?<![\w$])\$?([A-Z]{1,5}(?:[.-][A-Z]{1,2})?)(?![\w/])')
+_CASHTAG = re.compile(r'\$([A-Za-z]{1,5})\b')
+
+# Anything that needs reasoning, several tools or earlier context goes to the model.
+_NEEDS_MODEL = re.compile(
+    r'\b(and|or|vs|versus|compare|compared|between|why|should|predict|forecast|explain|better|worse|it|its|'
+    r'them|their|same|if|buy|sell)\b|,|;',
+    re.IGNORECASE
+)
+# The local tools only know the latest values, so questions about the past go to the model.
+_PAST = re.compile(
+    r'\b(was|were|did|had|ago|yesterday|previous|previously|historical|back in)\b'
+    r'|\b(in|during|since|before|after) (19|20)\d\d\b'
+    r'|\bon (\d{4}-\d{1,2}-\d{1,2}|\d{1,2}/\d{1,2}(/\d{2,4})?|'
+    r'(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.? \d{1,2})\b'
+    r'|\blast (week|month|year|quarter|monday|tuesday|wednesday|thursday|friday|close)\b',
+    re.IGNORECASE
+)
+MAX_WORDS = 12
+
+_WINDOW = re.compile(r'\b(\d{1,3})[- ]?(?:day|d)\b|\bwindow (?:of )?(\d{1,3})\b', re.IGNORECASE)
+_PERIOD = re.compile(r'\b(1d|5d|1mo|3mo|6mo|1y|2y|5y|10y|ytd|max)\b', re.IGNORECASE)
+_PERIOD_WORDS = [
+    (re.compile(r'\b(today|1 day|one day)\b', re.I), '1d'),
+    (re.compile(r'\b(5 days|five days|week)\b', re.I), '5d'),
+    (re.compile(r'\b(3 months|three months|quarter)\b', re.I), '3mo'),
+    (re.compile(r'\b(6 months|six months|half[- ]year)\b', re.I), '6mo'),
+    (re.compile(r'\b(1 month|one month|month)\b', re.I), '1mo'),
+    (re.compile(r'\b(2 years|two years)\b', re.I), '2y'),
+    (re.compile(r'\b(5 years|five years)\b', re.I), '5y'),
+    (re.compile(r'\b(10 years|ten years|decade)\b', re.I), '10y'),
+    (re.compile(r'\b(1 year|one year|year|12 months)\b', re.I), '1y'),
+]
+
+
+def _window(question):
+    match = _WINDOW.search(question)
+    return {'window': int(match.group(1) or match.group(2))} if match else None
+
+
+def _period(question):
+    match = _PERIOD.search(question)
+    if match:
+        return {'period': match.group(1).lower()}
+    for pattern, period in _PERIOD_WORDS:
+        if pattern.search(question):
+            return {'period': period}
+    return None
+
+
+def _no_args(question):
+    return {}
+
+
+# (function name, pattern, extra-argument parser). A parser returning None
+# means a required argument is missing and the question goes to the model.
+INTENTS = [
+    ('get_stock_price', re.compile(r'\b(price|quote|trading at)\b(?![- ]to[- ]earnings| chart| target)', re.I), _no_args),
+    ('calculate_RSI', re.compile(r'\brsi\b|relative strength', re.I), _no_args),
+    ('calculate_MACD', re.compile(r'\bmacd\b', re.I), _no_args),
+    ('calculate_SMA', re.compile(r'\bsma\b|simple moving average', re.I), _window),
+    ('calculate_EMA', re.compile(r'\bema\b|exponential moving average', re.I), _window),
+    ('get_market_cap', re.compile(r'market cap|market capitali[sz]ation|\bmcap\b', re.I), _no_args),
+    ('get_pe_ratio', re.compile(r'\bp/?e\b|price[- ]to[- ]earnings', re.I), _no_args),
+    ('get_52_week_high_low', re.compile(r'\b52[- ]?w(?:ee)?k|fifty[- ]two[- ]week', re.I), _no_args),
+    ('get_next_earnings_date', re.compile(r'\bearnings (?:date|call|report|release)|next earnings', re.I), _no_args),
+    ('get_dividend_info', re.compile(r'\bdividends?\b', re.I), _no_args),
+    ('get_stock_news', re.compile(r'\bnews\b|\bheadlines\b', re.I), _no_args),
+    ('plot_stock_price', re.compile(r'\b(plot|chart|graph)\b', re.I), _no_args),
+    ('calculate_daily_returns', re.compile(r'\bdaily returns?\b', re.I), _no_args),
+    ('average_volume', re.compile(r'\b(?:average|avg|mean) (?:trading |daily )?volume\b', re.I), _period),
+]
+
+
+def extract_tickers(question):
+    tickers = [t.upper() for t in _CASHTAG.findall(question)]
+    tickers += [t for t in _TICKER.findall(question) if t not in _NOT_TICKERS]
+    return list(dict.fromkeys(tickers))
+
+
+class IntentRouter:
+    """Answers simple single-tool questions ("price of AAPL", "RSI of TSLA") without the model.
+
+    route() returns (function name, arguments) only when exactly one intent and
+    exactly one ticker are found in a short question with nothing that needs
+    reasoning; everything else returns None and goes to the model as before.
+    """
+
+    def __init__(self, intents=INTENTS):
+        self.intents = intents
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._queries = 0
+        self._hits = 0
+        self._route_seconds = 0.0
+        self._llm_picks = 0
+        self._llm_pick_seconds = 0.0
+
+    def _match(self, question):
+        if len(question.split()) > MAX_WORDS or _NEEDS_MODEL.search(question) or _PAST.search(question):
+            return None
+        tickers = extract_tickers(question)
+        if len(tickers) != 1:
+            return None
+        matched = [(name, parse) for name, pattern, parse in self.intents if pattern.search(question)]
+        if len(matched) > 1:
+            # "price" also appears in "52-week high price", "price chart", ...
+            matched = [m for m in matched if m[0] != 'get_stock_price']
+        if len(matched) != 1:
+            return None
+        name, parse = matched[0]
+        args = parse(question)
+        if args is None:
+            return None
+        return name, {'ticker': tickers[0], **args}
+
+    def route(self, question):
+        if not self.enabled:
+            return None
+        started = time.perf_counter()
+        routed = self._match(question.strip())
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._queries += 1
+            self._hits += routed is not None
+            self._route_seconds += elapsed
+        return routed
+
+    def record_llm_pick(self, seconds):
+        """Record how long the model took to choose tools for a question the router passed on."""
+        with self._lock:
+            self._llm_picks += 1
+            self._llm_pick_seconds += seconds
+
+    def stats(self):
+        """Hit rate, mean routing cost and latency saved (hits × mean model tool-picking time)."""
+        with self._lock:
+            mean_pick = self._llm_pick_seconds / self._llm_picks if self._llm_picks else None
+            return {
+                'queries': self._queries,
+                'hits': self._hits,
+                'hit_rate': self._hits / self._queries if self._queries else 0.0,
+                'route_us_mean': self._route_seconds / self._queries * 1e6 if self._queries else 0.0,
+                'llm_pick_seconds_mean': mean_pick,
+                'saved_seconds': self._hits * mean_pick if mean_pick is not None else None,
+            }
+
+
+intent_router = IntentRouter()
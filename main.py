@@ -8,13 +8,59 @@ load_dotenv()
 # Import both features
 from chatbot import run_chatbot
 from forecast import run_forecast
+from intent_router import intent_router
+from tracing import start_metrics_server, tracer
 
 st.set_page_config(page_title="Stock Assistant", layout="wide")
 
+
+@st.cache_resource(show_spinner=False)
+def metrics_server(port):
+    # One Prometheus-style /metrics endpoint per server process.
+    return start_metrics_server(port)
+
+
+if os.environ.get('STOCKBOT_METRICS_PORT'):
+    metrics_server(int(os.environ['STOCKBOT_METRICS_PORT']))
+
+
+def render_timing_panel():
+    traces = st.session_state.get('last_traces') or []
+    for trace in traces:
+        st.sidebar.caption(f"Last {trace.kind} request")
+        st.sidebar.dataframe(
+            [{'stage': name, 'ms': round(seconds * 1000, 1)} for name, _, seconds in trace.spans],
+            hide_index=True,
+            use_container_width=True
+        )
+    summary = tracer.percentiles()
+    if summary:
+        st.sidebar.caption("All requests (ms)")
+        st.sidebar.dataframe(
+            [{'stage': stage, 'n': stats['count'], 'p50': round(stats['p50'] * 1000, 1),
+              'p95': round(stats['p95'] * 1000, 1), 'p99': round(stats['p99'] * 1000, 1)}
+             for stage, stats in summary.items()],
+            hide_index=True,
+            use_container_width=True
+        )
+    routing = intent_router.stats()
+    if routing['queries']:
+        saved = routing['saved_seconds']
+        st.sidebar.caption(
+            f"Routed locally: {routing['hits']}/{routing['queries']} questions ({routing['hit_rate']:.0%}), "
+            f"{routing['route_us_mean']:.0f} µs each"
+            + (f", ~{saved:.1f}s of model tool picking saved" if saved is not None else "")
+        )
+
+
 st.sidebar.title("📊 Stock Assistant")
 option = st.sidebar.radio("Select a feature", ["💬 Chatbot", "📈 Forecasting"])
+show_timings = st.sidebar.checkbox("⏱️ Show timings", value=False)
 
 if option == "💬 Chatbot":
     run_chatbot()
 else:
     run_forecast()
+
+if show_timings:
+    render_timing_panel()
@@ -0,0 +1,89 @@
+import struct
+
+import numpy as np
+import pandas as pd
+
+from atomic_files import atomic_write
+
+# File layout: a fixed 64-byte header followed by one contiguous column per
+# field, in this order: dates (int64 ns since epoch, UTC), Open, High, Low,
+# Close (float64 or float32) and Volume (int64).
+MAGIC = b'OHLCV\x00\x00\x01'
+VERSION = 1
+HEADER = struct.Struct('<8sIIQ32s')
+HEADER_SIZE = 64
+PRICE_COLUMNS = ('Open', 'High', 'Low', 'Close')
+
+
+def write_ohlcv(path, data, price_dtype=np.float64):
+    """Write a Date-indexed OHLCV frame to `path` in the columnar binary format."""
+    price_dtype = np.dtype(price_dtype)
+    index = pd.DatetimeIndex(data.index)
+    tz = str(index.tz) if index.tz is not None else ''
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    header = HEADER.pack(MAGIC, VERSION, price_dtype.itemsize, len(data), tz.encode())
+
+    with atomic_write(path, 'wb') as f:
+        f.write(header.ljust(HEADER_SIZE, b'\x00'))
+        f.write(index.to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+        for column in PRICE_COLUMNS:
+            f.write(data[column].to_numpy(dtype=price_dtype).tobytes())
+        f.write(data['Volume'].to_numpy(dtype=np.int64).tobytes())
+
+
+def open_ohlcv(path):
+    """Memory-map an OHLCV file written by `write_ohlcv` and return a read-only view."""
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    magic, version, itemsize, n_rows, tz = HEADER.unpack_from(buffer[:HEADER.size].tobytes())
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f'{path} is not an OHLCV v{VERSION} file')
+    return OHLCVView(buffer, n_rows, np.dtype(f'<f{itemsize}'), tz.rstrip(b'\x00').decode() or None)
+
+
+class OHLCVView:
+    """Zero-copy column arrays over a memory-mapped OHLCV file.
+
+    Every process mapping the same file shares its pages; nothing is parsed or
+    copied until a caller derives new arrays from the columns.
+    """
+
+    def __init__(self, buffer, n_rows, price_dtype, tz):
+        self.tz = tz
+        self._n_rows = n_rows
+        offset = HEADER_SIZE
+        self.dates = buffer[offset:offset + n_rows * 8].view('datetime64[ns]')
+        offset += n_rows * 8
+        self._columns = {}
+        for column in PRICE_COLUMNS:
+            size = n_rows * price_dtype.itemsize
+            self._columns[column] = buffer[offset:offset + size].view(price_dtype)
+            offset += size
+        self._columns['Volume'] = buffer[offset:offset + n_rows * 8].view(np.int64)
+
+    def __len__(self):
+        return self._n_rows
+
+    def column(self, name):
+        return self._columns[name]
+
+    def index(self):
+        index = pd.DatetimeIndex(self.dates, name='Date')
+        if self.tz:
+            index = index.tz_localize('UTC').tz_convert(self.tz)
+        return index
+
+    def series(self, name):
+        return pd.Series(self._columns[name], index=self.index(), name=name, copy=False)
+
+    def to_frame(self):
+        """Return a frame with a 'Date' column whose price columns wrap the mapped arrays."""
+        columns = {'Date': self.index()}
+        columns.update(self._columns)
+        return pd.DataFrame(columns, copy=False)
+
+    def prophet_frame(self, column):
+        """Return the ['ds', 'y'] frame Prophet expects, with tz-naive local dates."""
+        ds = self.index().tz_localize(None) if self.tz else self.index()
+        df = pd.DataFrame({'ds': ds, 'y': self._columns[column]}, copy=False)
+        return df.dropna()
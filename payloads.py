@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+
+# Upper bound on the tokens a single tool result may add to the follow-up
+# completion, per tool. Anything not listed gets DEFAULT_TOKEN_BUDGET.
+DEFAULT_TOKEN_BUDGET = 400
+TOOL_TOKEN_BUDGETS = {
+    'compare_stock_prices': 800,
+    'get_dividend_info': 300,
+}
+
+# Rough size of one "2024-01-31: 123.45" sample once tokenized, separator included.
+_TOKENS_PER_POINT = 8
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for English/number-heavy text (about four characters per token)."""
+    return (len(text) + 3) // 4
+
+
+def tool_budget(name):
+    return TOOL_TOKEN_BUDGETS.get(name, DEFAULT_TOKEN_BUDGET)
+
+
+def fit_to_budget(text, budget):
+    """Truncate `text` so it stays within roughly `budget` tokens."""
+    if estimate_tokens(text) <= budget:
+        return text
+    marker = ' …[truncated]'
+    return text[:max(0, budget * 4 - len(marker))] + marker
+
+
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets downsampling; returns the indices of the kept points.
+
+    Keeps the first and last points and, from each bucket in between, the
+    point forming the largest triangle with its neighbours, which preserves
+    peaks and troughs far better than taking every k-th value.
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    kept = [0]
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        a = kept[-1]
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        kept.append(start + int(np.argmax(areas)))
+    kept.append(n - 1)
+    return np.array(kept)
+
+
+def summarize_series(series, label):
+    """One-line summary statistics of a Date-indexed price series."""
+    series = series.dropna()
+    if series.empty:
+        return f'{label}: no data'
+    first, last = series.iloc[0], series.iloc[-1]
+    change = (last / first - 1) * 100 if first else float('nan')
+    return (
+        f'{label} ({series.index[0]:%Y-%m-%d} to {series.index[-1]:%Y-%m-%d}, {len(series)} closes): '
+        f'first {first:.2f}, last {last:.2f} ({change:+.1f}%), '
+        f'min {series.min():.2f} on {series.idxmin():%Y-%m-%d}, '
+        f'max {series.max():.2f} on {series.idxmax():%Y-%m-%d}, mean {series.mean():.2f}'
+    )
+
+
+def compact_series(series, label, budget):
+    """Summary plus an LTTB-downsampled series that together fit in `budget` tokens."""
+    series = series.dropna()
+    summary = summarize_series(series, label)
+    n_points = (budget - estimate_tokens(summary)) // _TOKENS_PER_POINT
+    if n_points < 3 or series.empty:
+        return fit_to_budget(summary, budget)
+    while True:
+        positions = np.arange(len(series)) if n_points >= len(series) else lttb(
+            np.arange(len(series)), series.to_numpy(), n_points)
+        sampled = series.iloc[positions]
+        samples = ', '.join(f'{ts:%Y-%m-%d}: {value:.2f}' for ts, value in sampled.items())
+        text = f'{summary}. Sampled closes: {samples}'
+        if estimate_tokens(text) <= budget or n_points <= 3:
+            return fit_to_budget(text, budget)
+        n_points = n_points * 3 // 4
+
+
+def dividends_by_year(dividends, budget=TOOL_TOKEN_BUDGETS['get_dividend_info']):
+    """Dividends aggregated per calendar year, most recent years kept first when over budget."""
+    if dividends is None or len(dividends) == 0:
+        return 'No dividends on record.'
+    dividends = pd.Series(dividends).dropna()
+    yearly = dividends.groupby(dividends.index.year).agg(['sum', 'count'])
+    latest = f'Latest: {dividends.iloc[-1]:.4g} on {dividends.index[-1]:%Y-%m-%d}.'
+    lines = []
+    for year, row in yearly.iloc[::-1].iterrows():
+        line = f'{year}: {row["sum"]:.4g} ({int(row["count"])} payments)'
+        if estimate_tokens(' '.join([latest, 'Per year:'] + lines + [line])) > budget:
+            break
+        lines.append(line)
+    return f'{latest} Per year: {"; ".join(reversed(lines))}.'
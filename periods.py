@@ -0,0 +1,50 @@
+import pandas as pd
+
+# yfinance periods ordered by how much history they cover.
+PERIOD_ORDER = ['1d', '5d', '1mo', '3mo', '6mo', 'ytd', '1y', '2y', '5y', '10y', 'max']
+
+_PERIOD_OFFSETS = {
+    '1mo': pd.DateOffset(months=1),
+    '3mo': pd.DateOffset(months=3),
+    '6mo': pd.DateOffset(months=6),
+    '1y': pd.DateOffset(years=1),
+    '2y': pd.DateOffset(years=2),
+    '5y': pd.DateOffset(years=5),
+    '10y': pd.DateOffset(years=10),
+}
+
+
+def covers(source, target):
+    """Return True if a series fetched for `source` contains all of `target`."""
+    if source == target:
+        return True
+    if source not in PERIOD_ORDER or target not in PERIOD_ORDER:
+        return False
+    # 'ytd' is anywhere between a few days and a year long.
+    if source == 'ytd':
+        return target in ('1d', '5d')
+    return PERIOD_ORDER.index(source) >= PERIOD_ORDER.index(target)
+
+
+def slice_period(data, period):
+    """Cut a longer daily history down to the rows yfinance would return for `period`."""
+    if period in ('1d', '5d'):
+        return data.iloc[-int(period[0]):]
+    if period == 'max' or data.empty:
+        return data
+    now = pd.Timestamp.now(tz=data.index.tz)
+    if period == 'ytd':
+        start = pd.Timestamp(year=now.year, month=1, day=1, tz=data.index.tz)
+    else:
+        start = now.normalize() - _PERIOD_OFFSETS[period]
+    return data.loc[data.index >= start]
+
+
+def align_tz(data, tz):
+    """Express `data`'s index in `tz`; grouped downloads come back with tz-naive dates."""
+    index = data.index
+    if index.tz is None and tz is not None:
+        index = index.tz_localize(tz)
+    elif index.tz is not None:
+        index = index.tz_convert(tz) if tz is not None else index.tz_localize(None)
+    return data.set_axis(index)
@@ -0,0 +1,339 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import prophet
+from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
+
+from atomic_files import atomic_write
+from lru import LRUCache
+from settings import DATA_DIR
+from singleflight import flights
+
+MODELS_DIR = os.path.join(DATA_DIR, 'models')
+
+# Hyperparameters of the dashboard's forecasting model. They are part of
+# every cache key, so changing them never serves a model fitted with others.
+PROPHET_PARAMS = {
+    'changepoint_prior_scale': 0.05,
+    'yearly_seasonality': True,
+    'weekly_seasonality': True,
+    'daily_seasonality': False,
+    'seasonality_mode': 'multiplicative',
+}
+
+# Refit from the previous model's parameters when only new bars arrived.
+WARM_START = True
+# Train on at most this many years of history (None: everything loaded).
+TRAINING_WINDOW_YEARS = None
+
+# How forecasts are predicted. 'standard' is Prophet's default: every
+# calendar day, intervals from 1000 simulated paths. 'fast' predicts trading
+# days only, weekly beyond `coarse_after_years`, and computes the intervals
+# in closed form (analytic_intervals) instead of simulating them; set
+# uncertainty_samples instead to keep simulated intervals with fewer paths.
+FORECAST_MODES = {
+    'standard': {'freq': 'D', 'uncertainty_samples': 1000, 'analytic_intervals': False,
+                 'coarse_freq': None, 'coarse_after_years': None},
+    'fast': {'freq': 'B', 'uncertainty_samples': 0, 'analytic_intervals': True,
+             'coarse_freq': 'W-FRI', 'coarse_after_years': 3},
+}
+DEFAULT_FORECAST_MODE = 'standard'
+
+# Fitted models and predictions kept in memory per process.
+MODEL_CACHE_MAX_ENTRIES = 32
+PREDICTION_CACHE_MAX_ENTRIES = 64
+
+
+def fit_prophet(df_prophet, params=PROPHET_PARAMS, init=None):
+    """Fit a Prophet model; `init` warm-starts the Stan optimizer (see stan_init)."""
+    model = Prophet(**params)
+    if init is None:
+        model.fit(df_prophet)
+    else:
+        model.fit(df_prophet, init=init)
+    return model
+
+
+def horizon_end(last_date, forecast_years):
+    """Last date a `forecast_years` forecast from `last_date` covers (365 days a year, as always)."""
+    return last_date + pd.Timedelta(days=365 * forecast_years)
+
+
+def future_frame(model, forecast_years, mode=DEFAULT_FORECAST_MODE):
+    """History dates plus the forecast dates of `mode`, as the 'ds' frame Prophet predicts on."""
+    settings = FORECAST_MODES[mode]
+    last = model.history['ds'].max()
+    end = horizon_end(last, forecast_years)
+    coarse_after = settings['coarse_after_years']
+    if settings['coarse_freq'] and coarse_after and forecast_years > coarse_after:
+        split = horizon_end(last, coarse_after)
+        dates = pd.date_range(last, split, freq=settings['freq'], inclusive='right').append(
+            pd.date_range(split, end, freq=settings['coarse_freq'], inclusive='right'))
+    else:
+        dates = pd.date_range(last, end, freq=settings['freq'], inclusive='right')
+    return pd.DataFrame({'ds': np.concatenate([model.history['ds'].to_numpy(), dates.to_numpy()])})
+
+
+def analytic_intervals(model, forecast):
+    """Add yhat_lower/yhat_upper to `forecast` in closed form instead of by simulation.
+
+    Prophet's simulated intervals combine observation noise with random
+    future trend changes: changepoints arriving at the rate seen in the
+    history, with Laplace slopes of the fitted mean magnitude. Integrated
+    twice, those changes give the trend a variance of 2 b^2 S h^3 / 3 at h
+    (scaled) time past the history, which is used here with the noise as a
+    normal approximation. The simulated trend changes are heavy-tailed, so
+    these bands come out somewhat wider than the simulated ones.
+    """
+    t = ((forecast['ds'] - model.start) / model.t_scale).to_numpy()
+    horizon = np.maximum(t - 1, 0)
+    mean_delta = np.mean(np.abs(model.params['delta'][0])) + 1e-8
+    rate = len(model.changepoints_t)
+    trend_sd = np.sqrt(2 * mean_delta ** 2 * rate * horizon ** 3 / 3) * model.y_scale
+    if 'multiplicative_terms' in forecast:
+        trend_sd = trend_sd * np.abs(1 + forecast['multiplicative_terms'].to_numpy())
+    noise_sd = model.params['sigma_obs'][0][0] * model.y_scale
+    spread = NormalDist().inv_cdf(0.5 + model.interval_width / 2) * np.sqrt(trend_sd ** 2 + noise_sd ** 2)
+    forecast['yhat_lower'] = forecast['yhat'] - spread
+    forecast['yhat_upper'] = forecast['yhat'] + spread
+    return forecast
+
+
+def predict_forecast(model, forecast_years, mode=DEFAULT_FORECAST_MODE):
+    settings = FORECAST_MODES[mode]
+    # A shallow copy, so the cached model shared by sessions is not modified.
+    model = copy.copy(model)
+    model.uncertainty_samples = settings['uncertainty_samples']
+    forecast = model.predict(future_frame(model, forecast_years, mode))
+    if settings['analytic_intervals']:
+        forecast = analytic_intervals(model, forecast)
+    return forecast
+
+
+def stan_init(model):
+    """Fitted parameters of `model` in the form Prophet.fit(init=...) takes, to warm-start a refit."""
+    init = {name: model.params[name][0][0] for name in ('k', 'm', 'sigma_obs')}
+    for name in ('delta', 'beta'):
+        init[name] = model.params[name][0]
+    return init
+
+
+def training_window(df_prophet, years=TRAINING_WINDOW_YEARS):
+    """Keep only the last `years` years of `df_prophet` (all of it when `years` is None)."""
+    if not years or df_prophet.empty:
+        return df_prophet
+    start = df_prophet['ds'].iloc[-1] - pd.DateOffset(years=years)
+    return df_prophet.loc[df_prophet['ds'] > start].reset_index(drop=True)
+
+
+def params_fingerprint(params=PROPHET_PARAMS):
+    """Short hash of the hyperparameters and the Prophet version (serialized models are version specific)."""
+    blob = json.dumps({'params': params, 'prophet': prophet.__version__}, sort_keys=True)
+    return hashlib.sha1(blob.encode()).hexdigest()[:12]
+
+
+def data_fingerprint(df_prophet):
+    """Hash of the training data: every date and value, so a new or restated bar changes it."""
+    digest = hashlib.sha1()
+    digest.update(df_prophet['ds'].to_numpy(dtype='datetime64[ns]').view(np.int64).tobytes())
+    digest.update(df_prophet['y'].to_numpy(dtype=np.float64).tobytes())
+    return digest.hexdigest()[:16]
+
+
+class ModelCache:
+    """Fitted Prophet models in memory and on disk, keyed by ticker, column, hyperparameters and data.
+
+    Models are stored with Prophet's JSON serialization, one file per key
+    under ticker=<T>/, so other sessions and restarts reuse them. Only the
+    newest model per (ticker, column, hyperparameters) is kept on disk.
+    Predictions are cached in memory per model and horizon, so reruns that
+    change nothing about the forecast don't even predict again.
+
+    When the data changed (a new bar), the refit warm-starts Stan from the
+    newest model's parameters instead of fitting from scratch, and the
+    training data can be capped to the last `training_years` years.
+    """
+
+    def __init__(self, root=MODELS_DIR, params=PROPHET_PARAMS, warm_start=WARM_START,
+                 training_years=TRAINING_WINDOW_YEARS):
+        self.root = root
+        self.params = params
+        self.params_key = params_fingerprint(params)
+        self.warm_start = warm_start
+        self.training_years = training_years
+        self.hits = 0
+        self.misses = 0
+        # One entry per fit: ticker, column, mode ('warm' or 'cold'), seconds, rows.
+        self.fits = deque(maxlen=1000)
+        self._models = LRUCache(MODEL_CACHE_MAX_ENTRIES)
+        self._predictions = LRUCache(PREDICTION_CACHE_MAX_ENTRIES)
+        self._lock = threading.Lock()
+
+    def key(self, ticker, column, df_prophet):
+        """Cache key of the model for `df_prophet`, after the training-window cap."""
+        df_prophet = training_window(df_prophet, self.training_years)
+        return ticker.upper(), column, self.params_key, data_fingerprint(df_prophet)
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, f'ticker={ticker}')
+
+    def _path(self, key):
+        ticker, column, params_key, data_key = key
+        return os.path.join(self._dir(ticker), f'{column}-{params_key}-{data_key}.json')
+
+    def _pointer_path(self, ticker, column):
+        return os.path.join(self._dir(ticker), f'{column}-{self.params_key}.latest')
+
+    def _read(self, key):
+        return self._read_path(self._path(key))
+
+    def _read_path(self, path):
+        try:
+            with open(path) as f:
+                return model_from_json(f.read())
+        except (OSError, ValueError, KeyError):
+            # Missing or unreadable (e.g. written by another Prophet version): refit.
+            return None
+
+    def _write(self, key, model):
+        ticker, column = key[0], key[1]
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        path = self._path(key)
+        with atomic_write(path) as f:
+            f.write(model_to_json(model))
+
+        pointer = self._pointer_path(ticker, column)
+        previous = self._read_pointer(ticker, column)
+        with atomic_write(pointer) as f:
+            f.write(os.path.basename(path))
+        if previous and previous != os.path.basename(path):
+            try:
+                os.remove(os.path.join(self._dir(ticker), previous))
+            except OSError:
+                pass
+
+    def _read_pointer(self, ticker, column):
+        try:
+            with open(self._pointer_path(ticker, column)) as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def latest(self, ticker, column):
+        """Return the newest model stored for `ticker`/`column` with these hyperparameters, or None."""
+        ticker = ticker.upper()
+        name = self._read_pointer(ticker, column)
+        if not name:
+            return None
+        return self._read_path(os.path.join(self._dir(ticker), name))
+
+    def lookup(self, key):
+        """Return the fitted model for `key` from memory or disk, or None."""
+        model = self._models.get(key)
+        if model is None:
+            model = self._read(key)
+            if model is not None:
+                self._models.put(key, model)
+        return model
+
+    def get(self, ticker, column, df_prophet):
+        """Return (key, model) fitted on `df_prophet` (capped to the training window), fitting only on a miss."""
+        df_prophet = training_window(df_prophet, self.training_years)
+        key = self.key(ticker, column, df_prophet)
+        model = self.lookup(key)
+        if model is not None:
+            with self._lock:
+                self.hits += 1
+            return key, model
+        with self._lock:
+            self.misses += 1
+        # Sessions opening the same ticker at once share a single fit.
+        return key, flights.do(('prophet_fit',) + key, lambda: self._fit(key, df_prophet))
+
+    def _fit(self, key, df_prophet):
+        model = self.lookup(key)
+        if model is None:
+            previous = self.latest(key[0], key[1]) if self.warm_start else None
+            started = time.perf_counter()
+            mode = 'cold'
+            if previous is not None:
+                try:
+                    model = fit_prophet(df_prophet, self.params, init=stan_init(previous))
+                    mode = 'warm'
+                except Exception:
+                    # Parameters that don't fit the new data shape; fit from scratch.
+                    model = None
+            if model is None:
+                model = fit_prophet(df_prophet, self.params)
+            self.fits.append({'ticker': key[0], 'column': key[1], 'mode': mode,
+                              'seconds': time.perf_counter() - started, 'rows': len(df_prophet)})
+            self._models.put(key, model)
+            self._write(key, model)
+        return model
+
+    def predict(self, key, model, forecast_years, predict, mode=DEFAULT_FORECAST_MODE):
+        """Return predict(model, forecast_years, mode), computed once per model, horizon and mode."""
+        prediction_key = key + (forecast_years, mode)
+        forecast = self._predictions.get(prediction_key)
+        if forecast is None:
+            forecast = flights.do(('prophet_predict',) + prediction_key,
+                                  lambda: predict(model, forecast_years, mode))
+            self._predictions.put(prediction_key, forecast)
+        return forecast
+
+    def clear(self):
+        """Forget in-memory models and predictions; the files on disk are kept."""
+        self._models.clear()
+        self._predictions.clear()
+
+    def stats(self):
+        """Cache hits and misses, plus count and mean seconds of warm and cold fits."""
+        with self._lock:
+            stats = {'hits': self.hits, 'misses': self.misses}
+        fits = list(self.fits)
+        for mode in ('warm', 'cold'):
+            seconds = [f['seconds'] for f in fits if f['mode'] == mode]
+            stats[f'{mode}_fits'] = len(seconds)
+            stats[f'{mode}_fit_seconds_mean'] = sum(seconds) / len(seconds) if seconds else None
+        return stats
+
+
+def refit_report(previous, df_prophet, horizon_days=365, params=PROPHET_PARAMS):
+    """Warm-start and cold fits of `df_prophet` side by side.
+
+    `previous` is the model fitted before the new bars arrived. Returns the
+    seconds each fit took and how far the warm fit's yhat drifts from the
+    cold fit's over the history plus `horizon_days`, in percent.
+    """
+    started = time.perf_counter()
+    warm = fit_prophet(df_prophet, params, init=stan_init(previous))
+    warm_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    cold = fit_prophet(df_prophet, params)
+    cold_seconds = time.perf_counter() - started
+
+    future = cold.make_future_dataframe(periods=horizon_days, freq='D')
+    warm_yhat = warm.predict(future)['yhat'].to_numpy()
+    cold_yhat = cold.predict(future)['yhat'].to_numpy()
+    drift = np.abs(warm_yhat - cold_yhat) / np.maximum(np.abs(cold_yhat), 1e-9) * 100
+    return {
+        'rows': len(df_prophet),
+        'warm_seconds': warm_seconds,
+        'cold_seconds': cold_seconds,
+        'speedup': cold_seconds / warm_seconds if warm_seconds else None,
+        'drift_mean_pct': float(drift.mean()),
+        'drift_max_pct': float(drift.max()),
+        'drift_end_pct': float(drift[-1]),
+    }
+
+
+model_cache = ModelCache()
@@ -0,0 +1,310 @@
+import json
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+import pandas as pd
+import yfinance as yf
+from yfinance.exceptions import YFException, YFTickerMissingError
+
+from periods import align_tz, slice_period
+
+
+class ProviderError(Exception):
+    """Raised by a provider when the upstream (real or simulated) fails."""
+
+
+class NoDataError(LookupError):
+    """Raised when there is no data for a ticker: an unknown, mistyped or delisted symbol."""
+
+
+class MarketDataProvider(ABC):
+    """Everything the app reads from a market data source.
+
+    history() mirrors yf.Ticker.history and returns a Date-indexed OHLCV
+    frame, empty for unknown tickers. download() fetches several tickers in one
+    request and returns {ticker: frame}, leaving out tickers with no rows. Both
+    index daily bars by tz-aware dates in the exchange's timezone, so frames
+    from either can be cached and joined together.
+    """
+
+    name = 'base'
+
+    @abstractmethod
+    def history(self, ticker, period=None, start=None, end=None, interval='1d'):
+        pass
+
+    @abstractmethod
+    def download(self, tickers, period=None, start=None, end=None, interval='1d'):
+        pass
+
+    @abstractmethod
+    def info(self, ticker):
+        pass
+
+    @abstractmethod
+    def calendar(self, ticker):
+        pass
+
+    @abstractmethod
+    def dividends(self, ticker):
+        pass
+
+    @abstractmethod
+    def news(self, ticker):
+        pass
+
+
+@contextmanager
+def _yfinance_errors():
+    # yfinance's own exceptions, mapped to what callers tell apart.
+    try:
+        yield
+    except YFTickerMissingError as e:
+        raise NoDataError(str(e)) from e
+    except YFException as e:
+        raise ProviderError(str(e)) from e
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = 'yfinance'
+
+    def history(self, ticker, period=None, start=None, end=None, interval='1d'):
+        if period is None and start is None:
+            period = '1mo'
+        with _yfinance_errors():
+            return yf.Ticker(ticker).history(period=period, start=start, end=end, interval=interval)
+
+    def download(self, tickers, period=None, start=None, end=None, interval='1d'):
+        with _yfinance_errors():
+            data = yf.download(
+                tickers,
+                period=period,
+                start=start,
+                end=end,
+                interval=interval,
+                group_by='ticker',
+                auto_adjust=True,
+                # Daily downloads drop the timezone by default; keep it, as history() does.
+                ignore_tz=False,
+                actions=True,
+                threads=True,
+                progress=False
+            )
+        if data.empty:
+            return {}
+        if not isinstance(data.columns, pd.MultiIndex):
+            frames = {tickers[0]: data}
+        else:
+            frames = {t: data[t] for t in tickers if t in data.columns.get_level_values(0)}
+        frames = {t: frame.dropna(how='all') for t, frame in frames.items()}
+        return {t: frame for t, frame in frames.items() if not frame.empty}
+
+    def info(self, ticker):
+        with _yfinance_errors():
+            return yf.Ticker(ticker).info
+
+    def calendar(self, ticker):
+        with _yfinance_errors():
+            return yf.Ticker(ticker).calendar
+
+    def dividends(self, ticker):
+        with _yfinance_errors():
+            return yf.Ticker(ticker).dividends
+
+    def news(self, ticker):
+        with _yfinance_errors():
+            return yf.Ticker(ticker).news
+
+
+def _slice_history(data, period=None, start=None, end=None):
+    if data.empty:
+        return data
+    if start is not None:
+        data = data.loc[data.index >= pd.Timestamp(start).tz_localize(data.index.tz)]
+    if end is not None:
+        data = data.loc[data.index < pd.Timestamp(end).tz_localize(data.index.tz)]
+    if period is not None:
+        data = slice_period(data, period)
+    return data
+
+
+class ReplayProvider(MarketDataProvider):
+    """Serves responses recorded under `root`, one directory per ticker.
+
+    Each ticker directory may hold history.parquet (the longest daily history
+    recorded), dividends.parquet, info.json, calendar.json and news.json.
+    Every call sleeps `latency_ms` plus up to `jitter_ms` and fails with
+    ProviderError with probability `error_rate`, to reproduce upstream
+    latency and error profiles offline.
+    """
+
+    name = 'replay'
+
+    def __init__(self, root, latency_ms=0, jitter_ms=0, error_rate=0.0, seed=None):
+        self.root = root
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _simulate_upstream(self, call):
+        with self._lock:
+            delay = self.latency_ms + self._random.uniform(0, self.jitter_ms)
+            failed = self._random.random() < self.error_rate
+        if delay:
+            time.sleep(delay / 1000)
+        if failed:
+            raise ProviderError(f'injected failure in {call}')
+
+    def _path(self, ticker, name):
+        return os.path.join(self.root, ticker.upper(), name)
+
+    def _read_frame(self, ticker, name):
+        path = self._path(ticker, name)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_parquet(path)
+
+    def _read_json(self, ticker, name, default):
+        try:
+            with open(self._path(ticker, name)) as f:
+                return json.load(f)
+        except OSError:
+            return default
+
+    def history(self, ticker, period=None, start=None, end=None, interval='1d'):
+        self._simulate_upstream('history')
+        return _slice_history(self._read_frame(ticker, 'history.parquet'), period, start, end)
+
+    def download(self, tickers, period=None, start=None, end=None, interval='1d'):
+        self._simulate_upstream('download')
+        frames = {t: _slice_history(self._read_frame(t, 'history.parquet'), period, start, end) for t in tickers}
+        return {t: frame for t, frame in frames.items() if not frame.empty}
+
+    def info(self, ticker):
+        self._simulate_upstream('info')
+        return self._read_json(ticker, 'info.json', {})
+
+    def calendar(self, ticker):
+        self._simulate_upstream('calendar')
+        return self._read_json(ticker, 'calendar.json', {})
+
+    def dividends(self, ticker):
+        self._simulate_upstream('dividends')
+        frame = self._read_frame(ticker, 'dividends.parquet')
+        return frame['Dividends'] if 'Dividends' in frame else pd.Series(dtype=float, name='Dividends')
+
+    def news(self, ticker):
+        self._simulate_upstream('news')
+        return self._read_json(ticker, 'news.json', [])
+
+
+class RecordingProvider(MarketDataProvider):
+    """Passes calls through to `inner` and records the responses for ReplayProvider."""
+
+    name = 'recording'
+
+    def __init__(self, inner, root):
+        self.inner = inner
+        self.root = root
+        self._lock = threading.Lock()
+
+    def _path(self, ticker, name):
+        directory = os.path.join(self.root, ticker.upper())
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def _record_history(self, ticker, data):
+        if data.empty:
+            return
+        path = self._path(ticker, 'history.parquet')
+        with self._lock:
+            if os.path.exists(path):
+                recorded = pd.read_parquet(path)
+                data = align_tz(data, recorded.index.tz).combine_first(recorded)
+            data.to_parquet(path)
+
+    def _record_json(self, ticker, name, value):
+        with open(self._path(ticker, name), 'w') as f:
+            json.dump(value, f, default=str)
+
+    def history(self, ticker, period=None, start=None, end=None, interval='1d'):
+        data = self.inner.history(ticker, period=period, start=start, end=end, interval=interval)
+        if interval == '1d':
+            self._record_history(ticker, data)
+        return data
+
+    def download(self, tickers, period=None, start=None, end=None, interval='1d'):
+        frames = self.inner.download(tickers, period=period, start=start, end=end, interval=interval)
+        if interval == '1d':
+            for ticker, data in frames.items():
+                self._record_history(ticker, data)
+        return frames
+
+    def info(self, ticker):
+        info = self.inner.info(ticker)
+        self._record_json(ticker, 'info.json', info)
+        return info
+
+    def calendar(self, ticker):
+        calendar = self.inner.calendar(ticker)
+        if isinstance(calendar, pd.DataFrame):
+            self._record_json(ticker, 'calendar.json', calendar.iloc[:, 0].to_dict() if not calendar.empty else {})
+        else:
+            self._record_json(ticker, 'calendar.json', calendar or {})
+        return calendar
+
+    def dividends(self, ticker):
+        dividends = self.inner.dividends(ticker)
+        dividends.rename('Dividends').to_frame().to_parquet(self._path(ticker, 'dividends.parquet'))
+        return dividends
+
+    def news(self, ticker):
+        news = self.inner.news(ticker)
+        self._record_json(ticker, 'news.json', news)
+        return news
+
+
+def provider_from_env():
+    """Build the provider selected by the STOCKBOT_PROVIDER family of environment variables."""
+    kind = os.environ.get('STOCKBOT_PROVIDER', 'yfinance')
+    if kind == 'replay':
+        provider = ReplayProvider(
+            os.environ.get('STOCKBOT_REPLAY_DIR', 'fixtures'),
+            latency_ms=float(os.environ.get('STOCKBOT_REPLAY_LATENCY_MS', 0)),
+            jitter_ms=float(os.environ.get('STOCKBOT_REPLAY_JITTER_MS', 0)),
+            error_rate=float(os.environ.get('STOCKBOT_REPLAY_ERROR_RATE', 0)),
+            seed=os.environ.get('STOCKBOT_REPLAY_SEED')
+        )
+    elif kind == 'yfinance':
+        provider = YFinanceProvider()
+    else:
+        raise ValueError(f'Unknown STOCKBOT_PROVIDER: {kind}')
+    if os.environ.get('STOCKBOT_RECORD_DIR'):
+        provider = RecordingProvider(provider, os.environ['STOCKBOT_RECORD_DIR'])
+    return provider
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """Return the process-wide market data provider, building it from the environment on first use."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = provider_from_env()
+        return _provider
+
+
+def set_provider(provider):
+    """Replace the process-wide provider (benchmarks, load tests, offline runs)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
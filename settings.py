@@ -0,0 +1,7 @@
+import os
+
+# Root for everything the app persists between restarts (price history, caches, models).
+DATA_DIR = os.environ.get(
+    'STOCKBOT_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.stockbot_data')
+)
@@ -0,0 +1,73 @@
+import threading
+from collections import defaultdict
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    still running wait for it and get the same result (or exception). Keys are
+    tuples whose first element names the kind of request, which is what the
+    metrics are grouped by.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._executed = defaultdict(int)
+        self._coalesced = defaultdict(int)
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self._coalesced[key[0]] += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self._executed[key[0]] += 1
+                leader = True
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        else:
+            call.done.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self):
+        """Return {kind: {'executed', 'coalesced', 'coalesced_ratio'}} plus the number of calls in flight."""
+        with self._lock:
+            kinds = {}
+            for kind in set(self._executed) | set(self._coalesced):
+                executed, coalesced = self._executed[kind], self._coalesced[kind]
+                kinds[kind] = {
+                    'executed': executed,
+                    'coalesced': coalesced,
+                    'coalesced_ratio': coalesced / (executed + coalesced),
+                }
+            return {'in_flight': len(self._calls), 'kinds': kinds}
+
+    def reset_stats(self):
+        with self._lock:
+            self._executed.clear()
+            self._coalesced.clear()
+
+
+flights = SingleFlight()
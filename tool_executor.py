@@ -0,0 +1,264 @@
+import inspect
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from lru import LRUCache
+from providers import ProviderError
+
+# Seconds a tool call may take before the answer goes ahead without it.
+DEFAULT_TOOL_TIMEOUT_SECONDS = 15
+TOOL_TIMEOUTS = {
+    'compare_stock_prices': 30,
+    'plot_stock_price': 20,
+    'get_stock_news': 10,
+}
+# Tool calls running at once across every session; this is what bounds
+# concurrent requests against the market data provider.
+MAX_CONCURRENT_TOOL_CALLS = 8
+
+# The circuit opens after this many upstream failures in a row and stays
+# open for CIRCUIT_RESET_SECONDS before letting a trial call through.
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_SECONDS = 30
+
+# Last good result per (tool, arguments), served while the circuit is open.
+LAST_GOOD_MAX_ENTRIES = 512
+
+# Failures of the upstream itself; only these (and timeouts) count towards
+# opening the circuit. Network errors are OSErrors.
+_UPSTREAM_ERRORS = (ProviderError, OSError)
+
+_JSON_TYPES = {
+    'string': str,
+    'integer': int,
+    'number': float,
+    'boolean': bool,
+}
+
+
+def _timed(function, kwargs):
+    start = time.perf_counter()
+    value = function(**kwargs)
+    return value, time.perf_counter() - start
+
+
+class ToolArgumentError(ValueError):
+    """Raised when a tool call's arguments don't match its schema."""
+
+
+def _coerce(name, value, schema):
+    kind = schema.get('type')
+    if kind == 'array':
+        if isinstance(value, str):
+            value = [v.strip() for v in value.split(',') if v.strip()]
+        if not isinstance(value, (list, tuple)):
+            raise ToolArgumentError(f'{name} must be a list')
+        return [_coerce(name, v, schema.get('items', {})) for v in value]
+    if kind == 'boolean' and isinstance(value, str):
+        return value.strip().lower() in ('true', '1', 'yes')
+    if kind in _JSON_TYPES:
+        try:
+            return _JSON_TYPES[kind](value)
+        except (TypeError, ValueError):
+            raise ToolArgumentError(f'{name} must be of type {kind}, got {value!r}')
+    return value
+
+
+class ToolSpec:
+    """A callable tool and the JSON schema its arguments are bound and checked against."""
+
+    def __init__(self, function, schema):
+        self.function = function
+        self.name = schema['name']
+        parameters = schema.get('parameters', {})
+        accepted = inspect.signature(function).parameters
+        self.properties = {k: v for k, v in parameters.get('properties', {}).items() if k in accepted}
+        self.required = [k for k in parameters.get('required', []) if k in self.properties]
+
+    def bind(self, arguments):
+        """Return keyword arguments for the function from the model's JSON arguments.
+
+        Values are coerced to the schema types, unknown keys are dropped and
+        optional ones left out fall back to the function's defaults.
+        """
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments or '{}')
+            except ValueError:
+                raise ToolArgumentError(f'arguments for {self.name} are not valid JSON')
+        if not isinstance(arguments, dict):
+            raise ToolArgumentError(f'arguments for {self.name} must be a JSON object')
+        missing = [k for k in self.required if arguments.get(k) in (None, '', [])]
+        if missing:
+            raise ToolArgumentError(f'{self.name} is missing {", ".join(missing)}')
+        return {
+            k: _coerce(k, arguments[k], schema)
+            for k, schema in self.properties.items()
+            if arguments.get(k) is not None
+        }
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker: closed, open for `reset_seconds`, then half-open."""
+
+    def __init__(self, threshold=CIRCUIT_FAILURE_THRESHOLD, reset_seconds=CIRCUIT_RESET_SECONDS):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return 'open'
+        return 'half-open'
+
+    def allow(self):
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """End a trial call that said nothing about the upstream's health, leaving the state as is."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or self.failures >= self.threshold:
+                if self.opened_at is None or self._trial_running:
+                    self.trips += 1
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class ToolResult:
+    """Outcome of one tool call.
+
+    `source` is 'live' for a fresh result, 'cached' for the last good result
+    served because the call failed or the circuit is open (`as_of` tells
+    when it was fetched), and 'error' when there was nothing to serve.
+    """
+
+    def __init__(self, call, value=None, error=None, source='live', as_of=None, seconds=0.0):
+        self.call = call
+        self.value = value
+        self.error = error
+        self.source = source
+        self.as_of = as_of
+        # Time the tool itself ran (or was waited for, on timeout).
+        self.seconds = seconds
+
+
+class ToolExecutor:
+    """Runs tool calls on a shared bounded pool with per-tool timeouts and a circuit breaker."""
+
+    def __init__(self, functions, schemas, max_concurrency=MAX_CONCURRENT_TOOL_CALLS, timeouts=TOOL_TIMEOUTS,
+                 breaker=None):
+        self.specs = {schema['name']: ToolSpec(functions[schema['name']], schema)
+                      for schema in schemas if schema['name'] in functions}
+        self.timeouts = timeouts
+        self.breaker = breaker or CircuitBreaker()
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='tool')
+        self._last_good = LRUCache(LAST_GOOD_MAX_ENTRIES)
+        self._lock = threading.Lock()
+        self.counts = {'calls': 0, 'timeouts': 0, 'errors': 0, 'rejected': 0, 'served_cached': 0}
+
+    def timeout(self, name):
+        return self.timeouts.get(name, DEFAULT_TOOL_TIMEOUT_SECONDS)
+
+    def _count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def _fallback(self, call, key, error):
+        entry = self._last_good.get(key)
+        if entry is None:
+            return ToolResult(call, error=error, source='error')
+        self._count('served_cached')
+        return ToolResult(call, value=entry[1], error=error, source='cached', as_of=entry[0])
+
+    def run(self, calls, on_done=None):
+        """Run [(call id, name, arguments)] concurrently and return a ToolResult per call, in order.
+
+        `on_done(result)` is called as each result is collected.
+        """
+        started = time.monotonic()
+        submitted = []
+        for call in calls:
+            _, name, arguments = call
+            self._count('calls')
+            try:
+                spec = self.specs.get(name)
+                if spec is None:
+                    raise ToolArgumentError(f'unknown tool {name}')
+                kwargs = spec.bind(arguments)
+            except ToolArgumentError as e:
+                submitted.append((call, None, None, ToolResult(call, error=str(e), source='error')))
+                continue
+            key = (name, json.dumps(kwargs, sort_keys=True, default=str))
+            if not self.breaker.allow():
+                self._count('rejected')
+                submitted.append((call, key, None, self._fallback(call, key, 'market data is temporarily unavailable')))
+                continue
+            submitted.append((call, key, self._pool.submit(_timed, spec.function, kwargs), None))
+
+        results = []
+        for call, key, future, result in submitted:
+            if result is None:
+                remaining = started + self.timeout(call[1]) - time.monotonic()
+                try:
+                    value, seconds = future.result(timeout=max(0, remaining))
+                except FutureTimeoutError:
+                    # A call still queued never starts; one already running is
+                    # left to finish in the background.
+                    future.cancel()
+                    self._count('timeouts')
+                    self.breaker.record_failure()
+                    result = self._fallback(call, key, f'timed out after {self.timeout(call[1])}s')
+                    result.seconds = time.monotonic() - started
+                except _UPSTREAM_ERRORS as e:
+                    self._count('errors')
+                    self.breaker.record_failure()
+                    result = self._fallback(call, key, str(e))
+                except Exception as e:
+                    # NoDataError for an unknown ticker, bad arguments, a value the
+                    # tool can't handle: the question's fault, not the upstream's.
+                    self._count('errors')
+                    self.breaker.release()
+                    result = ToolResult(call, error=str(e), source='error')
+                else:
+                    self.breaker.record_success()
+                    self._last_good.put(key, (time.time(), value))
+                    result = ToolResult(call, value=value, seconds=seconds)
+            if on_done:
+                on_done(result)
+            results.append(result)
+        return results
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self.counts)
+        return {**counts, 'circuit': self.breaker.state(), 'circuit_trips': self.breaker.trips}
@@ -0,0 +1,182 @@
+"""Per-stage latency tracing for chat answers and forecasts.
+
+A Trace collects named spans for one request (a chat question, a dashboard
+run). Finished traces feed per-stage latency samples, summarised as
+p50/p95/p99, and optionally get exported:
+
+- STOCKBOT_TRACE_FILE: every finished trace is appended as a JSON line.
+- STOCKBOT_METRICS_FILE: Prometheus text format, rewritten after each trace
+  (for the node_exporter textfile collector or plain inspection).
+- STOCKBOT_METRICS_PORT: serve the same text at http://localhost:<port>/metrics.
+"""
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from atomic_files import atomic_write
+# Latency samples kept per stage for the percentiles.
+MAX_SAMPLES_PER_STAGE = 2000
+# Finished traces kept in memory.
+MAX_TRACES = 200
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class Trace:
+    """Spans of one request: (name, start offset, seconds), plus free-form attributes."""
+
+    def __init__(self, kind, **attrs):
+        self.kind = kind
+        self.attrs = attrs
+        self.started = time.time()
+        self.spans = []
+        self.finished = False
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start, start - self._t0)
+
+    def add(self, name, seconds, offset=None):
+        """Record a stage timed elsewhere (another thread, a tool worker)."""
+        if offset is None:
+            offset = time.perf_counter() - self._t0 - seconds
+        with self._lock:
+            self.spans.append((name, offset, seconds))
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def to_dict(self):
+        with self._lock:
+            spans = list(self.spans)
+        return {
+            'kind': self.kind,
+            'started': self.started,
+            'attrs': self.attrs,
+            'spans': [{'name': n, 'offset_s': round(o, 6), 'seconds': round(s, 6)} for n, o, s in spans],
+        }
+
+
+class Tracer:
+    """Collects finished traces into per-stage latency histograms and exports them."""
+
+    def __init__(self, trace_file=None, metrics_file=None):
+        self.trace_file = trace_file
+        self.metrics_file = metrics_file
+        self._samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES_PER_STAGE))
+        self._counts = defaultdict(int)
+        self._sums = defaultdict(float)
+        self._traces = deque(maxlen=MAX_TRACES)
+        self._lock = threading.Lock()
+
+    def start(self, kind, **attrs):
+        return Trace(kind, **attrs)
+
+    def finish(self, trace):
+        """Record `trace` (once) and export it if exports are configured."""
+        if trace.finished:
+            return
+        trace.finished = True
+        trace.add('total', trace.elapsed(), 0.0)
+        record = trace.to_dict()
+        with self._lock:
+            for span in record['spans']:
+                stage = f"{trace.kind}.{span['name']}"
+                self._samples[stage].append(span['seconds'])
+                self._counts[stage] += 1
+                self._sums[stage] += span['seconds']
+            self._traces.append(record)
+        try:
+            if self.trace_file:
+                with open(self.trace_file, 'a') as f:
+                    f.write(json.dumps(record, default=str) + '\n')
+            if self.metrics_file:
+                # Every session's thread finishes traces; each writes its own tmp file.
+                with atomic_write(self.metrics_file) as f:
+                    f.write(self.prometheus_text())
+        except OSError:
+            # Exports are best effort; never fail a request over them.
+            pass
+
+    def recent(self, n=20):
+        with self._lock:
+            return list(self._traces)[-n:]
+
+    def percentiles(self):
+        """Return {stage: {'count', 'mean', 'p50', 'p95', 'p99'}} in seconds, over the recent samples."""
+        with self._lock:
+            samples = {stage: np.array(values) for stage, values in self._samples.items() if values}
+            counts = dict(self._counts)
+        summary = {}
+        for stage in sorted(samples):
+            values = samples[stage]
+            summary[stage] = {
+                'count': counts[stage],
+                'mean': float(values.mean()),
+                **{f'p{int(q * 100)}': float(np.quantile(values, q)) for q in QUANTILES},
+            }
+        return summary
+
+    def prometheus_text(self):
+        """Per-stage latency as a Prometheus summary (quantiles over the recent samples)."""
+        summary = self.percentiles()
+        with self._lock:
+            sums = dict(self._sums)
+        lines = [
+            '# HELP stockbot_stage_seconds Latency of each request stage.',
+            '# TYPE stockbot_stage_seconds summary',
+        ]
+        for stage, stats in summary.items():
+            for q in QUANTILES:
+                lines.append(f'stockbot_stage_seconds{{stage="{stage}",quantile="{q}"}} '
+                             f'{stats[f"p{int(q * 100)}"]:.6f}')
+            lines.append(f'stockbot_stage_seconds_sum{{stage="{stage}"}} {sums[stage]:.6f}')
+            lines.append(f'stockbot_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._sums.clear()
+            self._traces.clear()
+
+
+tracer = Tracer(
+    trace_file=os.environ.get('STOCKBOT_TRACE_FILE'),
+    metrics_file=os.environ.get('STOCKBOT_METRICS_FILE')
+)
+
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve tracer.prometheus_text() at /metrics from a daemon thread; returns the server."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path != '/metrics':
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server